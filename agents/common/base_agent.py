@@ -1,21 +1,80 @@
 import asyncio
+import os
+import time
+import uuid
 import platform
 import psutil
 import logging
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlparse
 from cryptography.fernet import Fernet
-import aiohttp
 import scapy.all as scapy
 
+from agents.common.capture import PacketCapture
+from agents.common.disk_queue import DiskQueue
+from agents.common.flow_table import FlowTable
+from agents.common.packet_buffer import BoundedPacketBuffer
+from agents.common.protocol import RecordBatch, check_compression, encode_frame, read_frame, seal_payload
+
 class BaseAgent:
-    def __init__(self, server_url: str, encryption_key: bytes):
+    def __init__(self, server_url: str, encryption_key: bytes, config: Optional[Dict] = None):
         self.server_url = server_url
+        self.server_address = self._parse_server_url(server_url)
         self.fernet = Fernet(encryption_key)
+        self.config = config or {}
+        agent_config = self.config.get('agents', {})
+        self.reconnect_delay = agent_config.get('reconnect_delay', 5)
+        self.heartbeat_interval = agent_config.get('heartbeat_interval', 30)
+
+        batch_config = agent_config.get('batch', {})
+        self.batch_max_records = batch_config.get('max_records', 5000)
+        self.batch_max_bytes = batch_config.get('max_bytes', 1024 * 1024)
+        self.batch_linger = batch_config.get('linger_ms', 200) / 1000
+        self.compression = batch_config.get('compression', 'zlib')
+        check_compression(self.compression)
+        self.stats = {
+            'batches_sent': 0,
+            'records_sent': 0,
+            'bytes_serialized': 0,
+            'bytes_sent': 0,
+            'last_batch_size': 0,
+            'last_compression_ratio': 0.0,
+            'last_send_latency': 0.0,
+            'batches_spooled': 0,
+            'batches_replayed': 0
+        }
         self.system_info = self._collect_system_info()
         self.logger = self._setup_logging()
-        self.packet_buffer = asyncio.Queue()
+
+        self.spool_config = agent_config.get('spool', {})
+        self.agent_id = self._load_agent_id(agent_config.get('id'))
+        self.replay_rate = self.spool_config.get('replay_rate', 20)
+        self.ack_timeout = self.spool_config.get('ack_timeout', 30)
+        self.max_unacked = self.spool_config.get('max_unacked', 64)
+        self.spool = self._setup_disk_queue('frames')
+        self.packet_buffer = self._setup_buffer(agent_config.get('buffer', {}))
+
+        self.capture_config = agent_config.get('capture', {})
+        self.capture: Optional[PacketCapture] = None
+
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._ack_task: Optional[asyncio.Task] = None
+        self._acked: Optional[asyncio.Event] = None
+        # Кадры текущего соединения без подтверждения сервера: (источник, кадр, время отправки)
+        self._unacked = deque()
+        self._acked_frames = 0
+        self._replaying = False
+        self._next_connect_at = 0.0
         self.is_running = False
+
+    @staticmethod
+    def _parse_server_url(server_url: str) -> Tuple[str, int]:
+        """Адрес сервера из URL вида tcp://host:port"""
+        parsed = urlparse(server_url if '://' in server_url else f'tcp://{server_url}')
+        return parsed.hostname or 'localhost', parsed.port or 8080
         
     def _setup_logging(self):
         """Настройка логирования для агента"""
@@ -27,6 +86,48 @@ class BaseAgent:
         logger.addHandler(handler)
         return logger
         
+    def _spool_directory(self) -> str:
+        return self.spool_config.get('directory', f'spool/agent_{platform.node()}')
+
+    def _load_agent_id(self, configured: Optional[str] = None) -> str:
+        """Постоянный идентификатор агента: из конфигурации или сохраненный в каталоге спула"""
+        if configured:
+            return str(configured)
+        path = os.path.join(self._spool_directory(), 'agent_id')
+        try:
+            with open(path) as f:
+                agent_id = f.read().strip()
+            if agent_id:
+                return agent_id
+        except FileNotFoundError:
+            pass
+        agent_id = uuid.uuid4().hex
+        os.makedirs(self._spool_directory(), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(agent_id)
+        return agent_id
+
+    def _setup_disk_queue(self, name: str) -> DiskQueue:
+        """Создание дисковой очереди в каталоге спула агента"""
+        return DiskQueue(
+            os.path.join(self._spool_directory(), name),
+            segment_size=self.spool_config.get('segment_size', 64 * 1024 * 1024),
+            max_bytes=self.spool_config.get('max_bytes', 1024 * 1024 * 1024),
+            fsync=self.spool_config.get('fsync', 'interval'),
+            fsync_interval=self.spool_config.get('fsync_interval', 1.0)
+        )
+
+    def _setup_buffer(self, buffer_config: Dict[str, Any]) -> BoundedPacketBuffer:
+        """Создание ограниченного буфера записей"""
+        policy = buffer_config.get('policy', 'drop_oldest')
+        return BoundedPacketBuffer(
+            capacity=buffer_config.get('capacity', 100000),
+            policy=policy,
+            sample_rate=buffer_config.get('sample_rate', 10),
+            spill_queue=self._setup_disk_queue('buffer') if policy == 'spill' else None,
+            spill_batch=buffer_config.get('spill_batch', 1000)
+        )
+
     def _collect_system_info(self) -> Dict[str, Any]:
         """Сбор информации о системе"""
         return {
@@ -41,39 +142,69 @@ class BaseAgent:
     async def start(self):
         """Запуск агента"""
         self.is_running = True
+        # Блокировка создается в работающем цикле событий (Python 3.8/3.9 привязывает ее к циклу)
+        self._write_lock = asyncio.Lock()
+        self._acked = asyncio.Event()
         self.logger.info("Starting NetGuardian agent")
         
         tasks = [
             self._network_monitor(),
             self._system_monitor(),
-            self._send_data_loop()
+            self._send_data_loop(),
+            self._replay_loop(),
+            self._heartbeat_loop(),
+            self._spool_flush_loop()
         ]
         
         await asyncio.gather(*tasks)
         
     async def _network_monitor(self):
-        """Мониторинг сетевой активности"""
-        def packet_callback(packet):
-            if self.is_running:
-                asyncio.run_coroutine_threadsafe(
-                    self.packet_buffer.put({
-                        'timestamp': datetime.now().isoformat(),
-                        'packet_summary': packet.summary(),
-                        'protocol': packet.name if hasattr(packet, 'name') else 'unknown',
-                        'size': len(packet)
-                    }), 
-                    asyncio.get_event_loop()
-                )
-        
-        # За��уск сниффера пакетов в отдельном потоке
-        scapy.sniff(prn=packet_callback, store=0)
-        
+        """Мониторинг сетевой активности.
+
+        Сниффер работает в собственном потоке, а здесь батчи из его канала
+        перекладываются в буфер отправки.
+        """
+        capture_settings = self.config.get('monitoring', {}).get('packet_capture', {})
+        if not capture_settings.get('enabled', True):
+            return
+
+        flow_table = None
+        flow_config = self.config.get('agents', {}).get('flows', {})
+        if flow_config.get('enabled', False):
+            flow_table = FlowTable(
+                idle_timeout=flow_config.get('idle_timeout', 15),
+                active_timeout=flow_config.get('active_timeout', 60),
+                max_flows=flow_config.get('max_flows', 100000)
+            )
+
+        interface = capture_settings.get('interface', 'any')
+        self.capture = PacketCapture(
+            asyncio.get_running_loop(),
+            interface=None if interface == 'any' else interface,
+            bpf_filter=capture_settings.get('filter'),
+            snaplen=capture_settings.get('snaplen', 128),
+            socket_buffer=capture_settings.get('buffer_size', 4 * 1024 * 1024),
+            batch_size=self.capture_config.get('batch_size', 256),
+            flush_interval=self.capture_config.get('flush_interval_ms', 50) / 1000,
+            channel_size=self.capture_config.get('channel_size', 1024),
+            flow_table=flow_table
+        )
+        self.capture.start()
+
+        async for batch in self.capture.batches():
+            for record in batch:
+                await self.packet_buffer.put(record)
+
+        if self.capture.error is not None:
+            self.logger.error(f"Packet capture failed: {str(self.capture.error)}")
+
     async def _system_monitor(self):
         """Мониторинг системных ресурсов"""
         while self.is_running:
             system_stats = {
                 'timestamp': datetime.now().isoformat(),
-                'cpu_percent': psutil.cpu_percent(interval=1),
+                # interval=None не блокирует цикл событий: загрузка считается с прошлого вызова
+                'cpu_percent': psutil.cpu_percent(interval=None),
                 'memory_percent': psutil.virtual_memory().percent,
                 'disk_usage': psutil.disk_usage('/').percent,
                 'network_io': psutil.net_io_counters()._asdict()
@@ -86,36 +217,280 @@ class BaseAgent:
             
             await asyncio.sleep(5)
             
+    async def _collect_batch(self) -> RecordBatch:
+        """Сбор батча из буфера с ограничением по числу записей, байтам и времени ожидания"""
+        loop = asyncio.get_running_loop()
+        batch = RecordBatch()
+        batch.add(await self.packet_buffer.get())
+        deadline = loop.time() + self.batch_linger
+
+        while len(batch) < self.batch_max_records and batch.size < self.batch_max_bytes:
+            if not self.packet_buffer.empty():
+                batch.add(self.packet_buffer.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.add(await asyncio.wait_for(self.packet_buffer.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    def _encode_batch(self, batch: RecordBatch) -> bytes:
+        """Сжатие и шифрование батча одним вызовом Fernet"""
+        payload = batch.payload()
+        frame = seal_payload(self.fernet, payload, self.compression)
+        self.stats['bytes_serialized'] += len(payload)
+        self.stats['last_compression_ratio'] = len(payload) / len(frame)
+        return frame
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики отправки данных"""
+        stats = dict(self.stats)
+        if stats['bytes_sent']:
+            stats['compression_ratio'] = stats['bytes_serialized'] / stats['bytes_sent']
+        if stats['batches_sent']:
+            stats['avg_batch_size'] = stats['records_sent'] / stats['batches_sent']
+        for name, value in self.packet_buffer.stats.items():
+            stats[f'buffer_{name}'] = value
+        stats['buffer_size'] = self.packet_buffer.qsize()
+        if self.capture is not None:
+            for name, value in self.capture.stats.items():
+                stats[f'capture_{name}'] = value
+            if self.capture.flow_table is not None:
+                for name, value in self.capture.flow_table.stats.items():
+                    stats[f'flows_{name}'] = value
+        stats['spool_pending'] = len(self.spool)
+        stats['spool_dropped'] = self.spool.dropped
+        return stats
+
+    async def _connect(self):
+        """Подключение к серверу не чаще раза в reconnect_delay секунд"""
+        loop = asyncio.get_running_loop()
+        if self._writer is not None or loop.time() < self._next_connect_at:
+            return
+        try:
+            reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(*self.server_address), self.reconnect_delay
+            )
+            self._acked_frames = 0
+            self._ack_task = asyncio.create_task(self._ack_loop(reader))
+            # Первый кадр соединения - приветствие с идентификатором агента
+            await self._write_frame(self._control_frame('hello', **self.system_info))
+            self.logger.info(f"Connected to server {self.server_url}")
+        except Exception as e:
+            self.logger.error(f"Failed to connect to server: {str(e)}")
+            self._disconnect()
+
+    def _disconnect(self):
+        """Разрыв соединения с сервером и планирование переподключения"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._ack_task is not None:
+            self._ack_task.cancel()
+            self._ack_task = None
+        self._requeue_unacked()
+        self._acked.set()
+        self._next_connect_at = asyncio.get_running_loop().time() + self.reconnect_delay
+
+    def _requeue_unacked(self):
+        """Возврат неподтвержденных кадров данных в дисковую очередь.
+
+        Досылаемый кадр и так остается в начале очереди до подтверждения,
+        а напрямую кадры отправляются только при пустой очереди, поэтому
+        порядок кадров сохраняется.
+        """
+        for source, frame, _ in self._unacked:
+            if source == 'live':
+                self._spool_frame(frame)
+        self._unacked.clear()
+        self._replaying = False
+
+    async def _ack_loop(self, reader: asyncio.StreamReader):
+        """Чтение подтверждений сервера.
+
+        Сервер подтверждает число принятых по соединению кадров нарастающим
+        итогом. Только после подтверждения досланный кадр удаляется из
+        дисковой очереди, а отправленный напрямую - из памяти: кадры,
+        оставшиеся в буфере сокета при падении сервера, будут отправлены
+        повторно.
+        """
+        try:
+            while True:
+                records = await read_frame(reader, self.fernet)
+                if records is None:
+                    raise ConnectionError("Сервер закрыл соединение")
+                for record in records:
+                    if record.get('type') == 'ack':
+                        self._confirm(int(record['frames']))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error reading acks: {str(e)}")
+            self._ack_task = None
+            self._disconnect()
+
+    def _confirm(self, frames: int):
+        """Обработка подтверждения первых frames кадров соединения"""
+        while self._acked_frames < frames and self._unacked:
+            source, _, _ = self._unacked.popleft()
+            self._acked_frames += 1
+            if source == 'replay':
+                self.spool.pop()
+                self._replaying = False
+                self.stats['batches_replayed'] += 1
+        self._acked.set()
+
+    def _control_frame(self, record_type: str, **fields) -> bytes:
+        """Кадр служебной записи (hello, heartbeat) с идентификатором агента"""
+        record = {
+            'type': record_type,
+            'agent_id': self.agent_id,
+            'timestamp': datetime.now().isoformat()
+        }
+        record.update(fields)
+        return encode_frame(self.fernet, [record], self.compression)
+
+    async def _write_frame(self, frame: bytes, source: str = 'control'):
+        """Отправка кадра по текущему соединению.
+
+        Кадры пишут несколько задач; блокировка не дает им чередоваться
+        внутри drain(), который на Python 3.8/3.9 не допускает
+        одновременного ожидания.
+
+        ``source``: ``live`` - новый кадр данных, ``replay`` - кадр из
+        дисковой очереди, ``control`` - служебный. Кадр учитывается в
+        ожидающих подтверждения до проверки соединения: при ошибке
+        вызывающий разрывает соединение, и кадр данных возвращается в
+        дисковую очередь.
+        """
+        async with self._write_lock:
+            self._unacked.append((source, frame if source == 'live' else None, time.monotonic()))
+            if self._writer is None:
+                raise ConnectionError("Нет соединения с сервером")
+            self._writer.write(frame)
+            await self._writer.drain()
+
+    def _spool_frame(self, frame: bytes):
+        """Сохранение неотправленного кадра в дисковую очередь"""
+        self.spool.append(frame)
+        self.stats['batches_spooled'] += 1
+
     async def _send_data_loop(self):
-        """Отправка данных на сервер"""
-        async with aiohttp.ClientSession() as session:
-            while self.is_running:
-                try:
-                    data = await self.packet_buffer.get()
-                    encrypted_data = self.fernet.encrypt(str(data).encode())
-                    
-                    async with session.post(
-                        f"{self.server_url}/data",
-                        data=encrypted_data
-                    ) as response:
-                        if response.status != 200:
-                            self.logger.error(
-                                f"Failed to send data: {await response.text()}"
-                            )
-                            
-                except Exception as e:
-                    self.logger.error(f"Error sending data: {str(e)}")
-                    await asyncio.sleep(5)
-                    
+        """Отправка данных на сервер по постоянному соединению.
+
+        Пока сервер недоступен, готовые кадры сохраняются на диск и
+        позже досылаются _replay_loop. Пока дисковая очередь не пуста,
+        новые кадры тоже ставятся в нее, чтобы сервер получал их после
+        досланных, а не вперемешку. Без подтверждения сервера в пути
+        находится не больше max_unacked кадров.
+        """
+        while self.is_running:
+            batch = await self._collect_batch()
+            frame = self._encode_batch(batch)
+
+            await self._connect()
+            while self._writer is not None and len(self._unacked) >= self.max_unacked:
+                self._acked.clear()
+                await self._acked.wait()
+            if self._writer is None or len(self.spool):
+                self._spool_frame(frame)
+                continue
+
+            started = time.perf_counter()
+            try:
+                await self._write_frame(frame, 'live')
+            except Exception as e:
+                # Кадр уже учтен как неподтвержденный и вернется в дисковую очередь
+                self.logger.error(f"Error sending data: {str(e)}")
+                self._disconnect()
+                continue
+
+            self.stats['last_send_latency'] = time.perf_counter() - started
+            self.stats['last_batch_size'] = len(batch)
+            self.stats['batches_sent'] += 1
+            self.stats['records_sent'] += len(batch)
+            self.stats['bytes_sent'] += len(frame)
+
+        self._disconnect()
+
+    async def _replay_loop(self):
+        """Досылка кадров из дисковой очереди по порядку с ограничением скорости.
+
+        Пока очередь не пуста, в нее идут и новые кадры, поэтому replay_rate
+        должен превышать обычную частоту кадров агента. Следующий кадр
+        отправляется после подтверждения предыдущего, который до этого
+        остается в начале очереди.
+
+        Здесь же проверяется срок подтверждения: соединение без ответа
+        сервера дольше ack_timeout разрывается, и кадры отправляются заново.
+        """
+        interval = 1 / self.replay_rate
+        while self.is_running:
+            await asyncio.sleep(interval)
+            if self._unacked and time.monotonic() - self._unacked[0][2] > self.ack_timeout:
+                self.logger.error(f"No ack from server for {self.ack_timeout}s, reconnecting")
+                self._disconnect()
+                continue
+            if self._writer is None or self._replaying or not len(self.spool):
+                continue
+
+            frame = self.spool.peek()
+            if frame is None:
+                continue
+            self._replaying = True
+            try:
+                await self._write_frame(frame, 'replay')
+            except Exception as e:
+                self.logger.error(f"Error replaying spooled data: {str(e)}")
+                self._disconnect()
+
+    async def _heartbeat_loop(self):
+        """Отправка heartbeat раз в heartbeat_interval, минуя буфер записей.
+
+        Сигнал не ждет в очереди за данными, поэтому сервер отличает
+        перегруженного агента от отключившегося.
+        """
+        while self.is_running:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self._writer is None:
+                continue
+            frame = self._control_frame(
+                'heartbeat',
+                buffer_size=self.packet_buffer.qsize(),
+                spool_pending=len(self.spool)
+            )
+            try:
+                await self._write_frame(frame)
+            except Exception as e:
+                self.logger.error(f"Error sending heartbeat: {str(e)}")
+                self._disconnect()
+
+    async def _spool_flush_loop(self):
+        """Периодический сброс дисковых очередей, в том числе при отсутствии новых записей"""
+        interval = self.spool_config.get('fsync_interval', 1.0)
+        while self.is_running:
+            await asyncio.sleep(interval)
+            self.packet_buffer.flush()
+            self.spool.flush()
+
     def stop(self):
         """Остановка агента"""
         self.is_running = False
+        if self.capture is not None:
+            self.capture.stop()
+        self._requeue_unacked()
+        self.packet_buffer.close()
+        self.spool.close()
         self.logger.info("Stopping NetGuardian agent")
 
 if __name__ == '__main__':
     # Пример использования
     ENCRYPTION_KEY = b'your-encryption-key-here'
-    SERVER_URL = 'http://localhost:8080'
+    SERVER_URL = 'tcp://localhost:8080'
     
     agent = BaseAgent(SERVER_URL, ENCRYPTION_KEY)
     try:
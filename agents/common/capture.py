@@ -0,0 +1,189 @@
+import asyncio
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import scapy.all as scapy
+
+from agents.common.flow_table import FlowTable
+from agents.common.header_parser import parse_ethernet, parse_raw_ip
+
+ETH_P_ALL = 0x0003
+ARPHRD_ETHER = 1
+ARPHRD_LOOPBACK = 772
+ARPHRD_NONE = 0xFFFE
+PACKET_OUTGOING = 4
+
+class PacketCapture:
+    """Захват пакетов в отдельном потоке.
+
+    Захват блокирует поток, поэтому работает вне цикла событий. Записи о
+    пакетах собираются в батчи и передаются циклу через ограниченный
+    потокобезопасный канал; если потребитель не успевает, батчи
+    отбрасываются, а захват не останавливается.
+
+    На Linux используется сокет AF_PACKET: BPF-фильтр выполняется в ядре,
+    а в пространство пользователя копируются только первые ``snaplen``
+    байт кадра, из которых напрямую разбираются заголовки. На остальных
+    платформах используется sniff из scapy с тем же фильтром.
+
+    Если передана ``flow_table``, пакеты агрегируются в потоки прямо в
+    потоке захвата, и в канал попадают только записи о потоках.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interface: Optional[str] = None,
+                 bpf_filter: Optional[str] = None, snaplen: int = 128,
+                 socket_buffer: int = 4 * 1024 * 1024, batch_size: int = 256,
+                 flush_interval: float = 0.05, channel_size: int = 1024,
+                 flow_table: Optional[FlowTable] = None):
+        self.loop = loop
+        self.flow_table = flow_table
+        self.interface = interface
+        self.bpf_filter = bpf_filter
+        self.snaplen = snaplen
+        self.socket_buffer = socket_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.channel: 'queue.Queue[List[Dict[str, Any]]]' = queue.Queue(maxsize=channel_size)
+        self.ready = asyncio.Event()
+        self.stats = {
+            'captured': 0,
+            'unparsed': 0,
+            'enqueued': 0,
+            'dropped': 0
+        }
+        self._batch: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[Exception] = None
+
+    def start(self):
+        """Запуск потока захвата"""
+        self._thread = threading.Thread(target=self._run, name='PacketCapture', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка захвата"""
+        self._stop.set()
+
+    def _run(self):
+        try:
+            if hasattr(socket, 'AF_PACKET'):
+                self._run_packet_socket()
+            else:
+                self._run_sniff()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._stop.set()
+            if self.flow_table is not None:
+                self._batch.extend(self.flow_table.flush())
+            self._flush()
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+    def _open_packet_socket(self) -> socket.socket:
+        """Сокет AF_PACKET с BPF-фильтром в ядре"""
+        from scapy.arch.linux import attach_filter
+
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_buffer)
+        if self.bpf_filter:
+            attach_filter(sock, self.bpf_filter, self.interface)
+        if self.interface:
+            sock.bind((self.interface, ETH_P_ALL))
+        # Таймаут позволяет отправлять неполные батчи и проверять флаг остановки в тишине
+        sock.settimeout(self.flush_interval)
+        return sock
+
+    def _run_packet_socket(self):
+        sock = self._open_packet_socket()
+        buffer = bytearray(self.snaplen)
+        view = memoryview(buffer)
+        try:
+            while not self._stop.is_set():
+                try:
+                    # MSG_TRUNC: копируется snaplen байт, но возвращается полная длина кадра
+                    length, address = sock.recvfrom_into(buffer, self.snaplen, socket.MSG_TRUNC)
+                except socket.timeout:
+                    self._expire_flows()
+                    self._flush()
+                    continue
+                _, _, packet_type, hatype, _ = address
+                # На loopback каждый пакет виден дважды: как исходящий и как входящий
+                if packet_type == PACKET_OUTGOING and hatype == ARPHRD_LOOPBACK:
+                    continue
+                frame = bytes(view[:min(length, self.snaplen)])
+                self._on_frame(frame, length, hatype)
+        finally:
+            sock.close()
+
+    def _run_sniff(self):
+        scapy.sniff(
+            prn=self._on_packet, store=0,
+            iface=self.interface, filter=self.bpf_filter,
+            stop_filter=lambda _: self._stop.is_set()
+        )
+
+    def _on_packet(self, packet):
+        """Обработчик пакета scapy (платформы без AF_PACKET)"""
+        self._on_frame(bytes(packet)[:self.snaplen], len(packet), ARPHRD_ETHER)
+
+    def _on_frame(self, frame: bytes, wire_length: int, hatype: int):
+        """Обработчик кадра в потоке захвата"""
+        self.stats['captured'] += 1
+        if hatype == ARPHRD_NONE:
+            record = parse_raw_ip(frame, wire_length)
+        elif hatype in (ARPHRD_ETHER, ARPHRD_LOOPBACK):
+            record = parse_ethernet(frame, wire_length)
+        else:
+            record = None
+        if record is None:
+            self.stats['unparsed'] += 1
+            return
+
+        if self.flow_table is not None:
+            self._batch.extend(self.flow_table.add(record, time.time()))
+        else:
+            record['timestamp'] = datetime.now().isoformat()
+            self._batch.append(record)
+
+        if (len(self._batch) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self._expire_flows()
+            self._flush()
+
+    def _expire_flows(self):
+        if self.flow_table is not None:
+            self._batch.extend(self.flow_table.expire(time.time()))
+
+    def _flush(self):
+        """Передача накопленного батча в канал"""
+        self._last_flush = time.monotonic()
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        try:
+            self.channel.put_nowait(batch)
+        except queue.Full:
+            self.stats['dropped'] += len(batch)
+            return
+        self.stats['enqueued'] += len(batch)
+        # Будим потребителя, только если он еще не разбужен
+        if not self.ready.is_set():
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+    async def batches(self):
+        """Асинхронный итератор по батчам из канала"""
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while True:
+                try:
+                    yield self.channel.get_nowait()
+                except queue.Empty:
+                    break
+            if self._stop.is_set() and self.channel.empty():
+                return
@@ -0,0 +1,304 @@
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import List, Optional
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+ENTRY_HEADER = struct.Struct('!II')  # длина, crc32
+CURSOR = struct.Struct('!QQ')        # номер сегмента, смещение
+
+class Segment:
+    """Сегмент очереди: предвыделенный файл, отображенный в память"""
+
+    def __init__(self, path: str, seq: int, size: int):
+        self.path = path
+        self.seq = seq
+        self._file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        if os.fstat(self._file.fileno()).st_size < size:
+            self._file.truncate(size)
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.map = mmap.mmap(self._file.fileno(), self.size)
+        self.write_offset = 0
+
+    def read_entry(self, offset: int) -> Optional[bytes]:
+        """Чтение записи по смещению; None в конце записанных данных"""
+        if offset + ENTRY_HEADER.size > self.size:
+            return None
+        length, checksum = ENTRY_HEADER.unpack_from(self.map, offset)
+        start = offset + ENTRY_HEADER.size
+        if length == 0 or start + length > self.size:
+            return None
+        data = self.map[start:start + length]
+        if zlib.crc32(data) != checksum:
+            return None
+        return data
+
+    def recover(self) -> int:
+        """Поиск конца записанных данных после перезапуска, возвращает число записей"""
+        count = 0
+        offset = 0
+        while True:
+            data = self.read_entry(offset)
+            if data is None:
+                break
+            offset += ENTRY_HEADER.size + len(data)
+            count += 1
+        self.write_offset = offset
+        return count
+
+    def fits(self, length: int) -> bool:
+        return self.write_offset + ENTRY_HEADER.size + length <= self.size
+
+    def append(self, data: bytes):
+        ENTRY_HEADER.pack_into(self.map, self.write_offset, len(data), zlib.crc32(data))
+        start = self.write_offset + ENTRY_HEADER.size
+        self.map[start:start + len(data)] = data
+        self.write_offset = start + len(data)
+        # Нулевой заголовок после записи отделяет ее от старых данных переиспользованного сегмента
+        if self.write_offset + ENTRY_HEADER.size <= self.size:
+            ENTRY_HEADER.pack_into(self.map, self.write_offset, 0, 0)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self._file.close()
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
+
+class DiskQueue:
+    """Дисковая очередь из сегментов, отображенных в память.
+
+    Записи только дописываются в конец последнего сегмента и читаются в
+    порядке поступления. Позиция чтения сохраняется в файле ``cursor``,
+    поэтому после перезапуска агента очередь продолжает с первой
+    неподтвержденной записи. Полностью прочитанные сегменты удаляются;
+    при превышении ``max_bytes`` удаляется самый старый сегмент.
+
+    ``fsync``: ``always`` - сброс на диск после каждой операции,
+    ``interval`` - не чаще раза в ``fsync_interval`` секунд,
+    ``never`` - на усмотрение ОС.
+
+    Кроме режима ``always`` позиция чтения записывается не после каждой
+    записи, а раз в ``fsync_interval`` секунд и в ``flush()``: после сбоя
+    последние прочитанные записи могут быть выданы повторно. Исключение -
+    опустевшая очередь, которая переиспользует сегмент с начала: позиция
+    сохраняется сразу, иначе устаревший курсор указал бы внутрь новых
+    записей. Без новых операций данные сбрасываются только вызовом
+    ``flush()``, поэтому владелец очереди вызывает его по таймеру.
+
+    Поврежденная запись (несовпадение crc32) пропускается вместе с
+    остатком сегмента, так как граница следующей записи неизвестна;
+    потерянные записи учитываются в ``dropped``.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024,
+                 max_bytes: int = 1024 * 1024 * 1024, fsync: str = 'interval',
+                 fsync_interval: float = 1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Неизвестная политика fsync: {fsync}")
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.pending = 0
+        self.dropped = 0
+        self._segments: List[Segment] = []
+        self._read_offset = 0
+        self._last_sync = time.monotonic()
+        self._last_cursor_save = time.monotonic()
+        self._cursor_dirty = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._cursor_path = os.path.join(directory, 'cursor')
+        self._open()
+
+    def __len__(self) -> int:
+        return self.pending
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(segment.size for segment in self._segments)
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f'{seq:020d}.seg')
+
+    def _open(self):
+        """Восстановление состояния очереди с диска"""
+        read_seq, read_offset = 0, 0
+        if os.path.exists(self._cursor_path):
+            with open(self._cursor_path, 'rb') as f:
+                data = f.read(CURSOR.size)
+            if len(data) == CURSOR.size:
+                read_seq, read_offset = CURSOR.unpack(data)
+
+        seqs = sorted(
+            int(name[:-4]) for name in os.listdir(self.directory) if name.endswith('.seg')
+        )
+        for seq in seqs:
+            path = self._segment_path(seq)
+            if seq < read_seq or os.path.getsize(path) < ENTRY_HEADER.size:
+                # Прочитанный сегмент или пустой файл, оставшийся от сбоя при создании
+                os.remove(path)
+                continue
+            segment = Segment(self._segment_path(seq), seq, 0)
+            self.pending += segment.recover()
+            self._segments.append(segment)
+
+        if self._segments and self._segments[0].seq == read_seq:
+            # Позиция из устаревшего курсора может указывать внутрь записи:
+            # чтение продолжается с границы записи перед ней
+            segment = self._segments[0]
+            offset = 0
+            while offset < read_offset:
+                data = segment.read_entry(offset)
+                if data is None or offset + ENTRY_HEADER.size + len(data) > read_offset:
+                    break
+                offset += ENTRY_HEADER.size + len(data)
+                self.pending -= 1
+            self._read_offset = offset
+
+    @staticmethod
+    def _count_entries(segment: Segment, start: int, end: int) -> int:
+        count = 0
+        offset = start
+        while offset < end:
+            data = segment.read_entry(offset)
+            if data is None:
+                break
+            offset += ENTRY_HEADER.size + len(data)
+            count += 1
+        return count
+
+    def _roll(self, length: int) -> Segment:
+        """Открытие нового сегмента для записи"""
+        seq = self._segments[-1].seq + 1 if self._segments else 0
+        if self._segments and self.fsync != 'never':
+            self._segments[-1].flush()
+        size = max(self.segment_size, ENTRY_HEADER.size + length)
+        segment = Segment(self._segment_path(seq), seq, size)
+        self._segments.append(segment)
+
+        while len(self._segments) > 1 and self.size_bytes > self.max_bytes:
+            self._drop_oldest()
+        return segment
+
+    def _drop_oldest(self):
+        segment = self._segments.pop(0)
+        lost = self._count_entries(segment, self._read_offset, segment.write_offset)
+        self.pending -= lost
+        self.dropped += lost
+        segment.remove()
+        self._read_offset = 0
+        self._cursor_dirty = True
+
+    def append(self, data: bytes):
+        """Добавление записи в конец очереди"""
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or not segment.fits(len(data)):
+            segment = self._roll(len(data))
+        segment.append(data)
+        self.pending += 1
+        self._sync(segment)
+
+    def peek(self) -> Optional[bytes]:
+        """Самая старая неподтвержденная запись"""
+        while self._segments:
+            segment = self._segments[0]
+            data = segment.read_entry(self._read_offset) if self._read_offset < segment.write_offset else None
+            if data is not None:
+                return data
+            if self._read_offset < segment.write_offset:
+                self._discard_corrupt()
+                continue
+            if len(self._segments) == 1:
+                return None
+            # Сегмент прочитан полностью и уже не является текущим для записи
+            self._segments.pop(0).remove()
+            self._read_offset = 0
+            self._cursor_dirty = True
+        return None
+
+    def _discard_corrupt(self):
+        """Пропуск остатка первого сегмента, начиная с поврежденной записи"""
+        remaining = sum(
+            self._count_entries(segment, 0, segment.write_offset) for segment in self._segments[1:]
+        )
+        if len(self._segments) == 1:
+            segment = self._segments[0]
+            ENTRY_HEADER.pack_into(segment.map, 0, 0, 0)
+            segment.write_offset = 0
+        else:
+            self._segments.pop(0).remove()
+        self.dropped += max(0, self.pending - remaining)
+        self.pending = remaining
+        self._read_offset = 0
+        self._save_cursor()
+
+    def pop(self) -> Optional[bytes]:
+        """Подтверждение и извлечение самой старой записи"""
+        data = self.peek()
+        if data is None:
+            return None
+        self._read_offset += ENTRY_HEADER.size + len(data)
+        self.pending -= 1
+
+        segment = self._segments[0]
+        if not self.pending and len(self._segments) == 1:
+            # Очередь опустела: переиспользуем сегмент с начала
+            ENTRY_HEADER.pack_into(segment.map, 0, 0, 0)
+            segment.write_offset = 0
+            self._read_offset = 0
+            self._save_cursor()
+            return data
+        self._cursor_dirty = True
+        if self.fsync == 'always':
+            self._save_cursor()
+        elif time.monotonic() - self._last_cursor_save >= self.fsync_interval:
+            self._save_cursor()
+        return data
+
+    def _save_cursor(self):
+        self._cursor_dirty = False
+        self._last_cursor_save = time.monotonic()
+        seq = self._segments[0].seq if self._segments else 0
+        tmp_path = self._cursor_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(CURSOR.pack(seq, self._read_offset))
+            if self.fsync == 'always':
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self._cursor_path)
+
+    def _sync(self, segment: Segment):
+        if self.fsync == 'always':
+            segment.flush()
+        elif self.fsync == 'interval':
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_interval:
+                segment.flush()
+                self._last_sync = now
+
+    def flush(self):
+        """Сброс последнего сегмента и позиции чтения на диск"""
+        if self._segments and self.fsync != 'never':
+            self._segments[-1].flush()
+            self._last_sync = time.monotonic()
+        if self._cursor_dirty:
+            self._save_cursor()
+
+    def close(self):
+        """Сброс на диск и закрытие сегментов"""
+        if self._cursor_dirty:
+            self._save_cursor()
+        for segment in self._segments:
+            if self.fsync != 'never':
+                segment.flush()
+            segment.close()
+        self._segments = []
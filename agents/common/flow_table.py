@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from agents.common.header_parser import IP_PROTOCOLS
+
+TCP_FIN = 0x01
+TCP_RST = 0x04
+
+FlowKey = Tuple[str, str, int, int, int]
+
+class FlowTable:
+    """Агрегация пакетов в потоки по 5-кортежу (в стиле NetFlow).
+
+    Поток экспортируется, когда:
+
+    * он простаивает дольше ``idle_timeout``;
+    * с его начала прошло больше ``active_timeout`` (длинные потоки
+      выгружаются периодически);
+    * получен TCP FIN или RST;
+    * таблица переполнена - тогда экспортируется самый давно активный поток.
+
+    Потоки хранятся в порядке последней активности, поэтому поиск
+    простаивающих не требует обхода всей таблицы.
+    """
+
+    def __init__(self, idle_timeout: float = 15.0, active_timeout: float = 60.0,
+                 max_flows: int = 100000):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        # ключ -> [first_seen, last_seen, packets, bytes, tcp_flags]
+        self._flows: 'OrderedDict[FlowKey, list]' = OrderedDict()
+        self.stats = {
+            'packets': 0,
+            'exported': 0,
+            'evicted': 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    def add(self, packet: Dict[str, Any], now: float) -> List[Dict[str, Any]]:
+        """Учет пакета, возвращает потоки, готовые к экспорту"""
+        self.stats['packets'] += 1
+        key = (packet['src_ip'], packet['dst_ip'], packet['src_port'],
+               packet['dst_port'], packet['ip_proto'])
+        exported = []
+
+        flow = self._flows.get(key)
+        if flow is not None and now - flow[0] >= self.active_timeout:
+            exported.append(self._export(key, self._flows.pop(key)))
+            flow = None
+
+        if flow is None:
+            flow = [now, now, 0, 0, 0]
+            self._flows[key] = flow
+            if len(self._flows) > self.max_flows:
+                oldest_key, oldest = self._flows.popitem(last=False)
+                exported.append(self._export(oldest_key, oldest))
+                self.stats['evicted'] += 1
+        else:
+            self._flows.move_to_end(key)
+
+        flow[1] = now
+        flow[2] += 1
+        flow[3] += packet['size']
+        flow[4] |= packet.get('tcp_flags', 0)
+
+        if packet.get('tcp_flags', 0) & (TCP_FIN | TCP_RST):
+            exported.append(self._export(key, self._flows.pop(key)))
+
+        return exported
+
+    def expire(self, now: float) -> List[Dict[str, Any]]:
+        """Экспорт потоков, простаивающих дольше idle_timeout"""
+        exported = []
+        while self._flows:
+            key, flow = next(iter(self._flows.items()))
+            if now - flow[1] < self.idle_timeout:
+                break
+            self._flows.popitem(last=False)
+            exported.append(self._export(key, flow))
+        return exported
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Экспорт всех потоков"""
+        exported = [self._export(key, flow) for key, flow in self._flows.items()]
+        self._flows.clear()
+        return exported
+
+    def _export(self, key: FlowKey, flow: list) -> Dict[str, Any]:
+        self.stats['exported'] += 1
+        src_ip, dst_ip, src_port, dst_port, ip_proto = key
+        return {
+            'type': 'flow',
+            'src_ip': src_ip,
+            'dst_ip': dst_ip,
+            'src_port': src_port,
+            'dst_port': dst_port,
+            'ip_proto': ip_proto,
+            'protocol': IP_PROTOCOLS.get(ip_proto, 'unknown'),
+            'first_seen': flow[0],
+            'last_seen': flow[1],
+            'packets': flow[2],
+            'bytes': flow[3],
+            'tcp_flags': flow[4]
+        }
@@ -0,0 +1,85 @@
+"""Разбор заголовков пакета напрямую из сырых байтов.
+
+Достаточно первых ~100 байт кадра: извлекаются только поля, нужные
+анализатору, без построения объектов scapy и их текстового описания.
+"""
+import socket
+import struct
+from typing import Any, Dict, Optional
+
+ETH_HEADER = struct.Struct('!6s6sH')
+VLAN_TAG = struct.Struct('!HH')
+IPV4_HEADER = struct.Struct('!BBHHHBBH4s4s')
+IPV6_HEADER = struct.Struct('!IHBB16s16s')
+PORTS = struct.Struct('!HH')
+
+ETH_P_IPV4 = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_VLAN = (0x8100, 0x88A8)
+
+IP_PROTOCOLS = {
+    1: 'icmp',
+    6: 'tcp',
+    17: 'udp',
+    58: 'icmp'
+}
+
+def parse_ethernet(frame: bytes, wire_length: int) -> Optional[Dict[str, Any]]:
+    """Разбор Ethernet-кадра (в том числе с тегами VLAN)"""
+    if len(frame) < ETH_HEADER.size:
+        return None
+    _, _, ethertype = ETH_HEADER.unpack_from(frame)
+    offset = ETH_HEADER.size
+    while ethertype in ETH_P_VLAN and len(frame) >= offset + VLAN_TAG.size:
+        _, ethertype = VLAN_TAG.unpack_from(frame, offset)
+        offset += VLAN_TAG.size
+    return parse_ip(frame, offset, ethertype, wire_length)
+
+def parse_raw_ip(frame: bytes, wire_length: int) -> Optional[Dict[str, Any]]:
+    """Разбор IP-пакета без канального заголовка (tun-интерфейсы)"""
+    if not frame:
+        return None
+    version = frame[0] >> 4
+    ethertype = ETH_P_IPV4 if version == 4 else ETH_P_IPV6 if version == 6 else None
+    return parse_ip(frame, 0, ethertype, wire_length)
+
+def parse_ip(frame: bytes, offset: int, ethertype: Optional[int],
+             wire_length: int) -> Optional[Dict[str, Any]]:
+    """Разбор заголовков IPv4/IPv6 и портов TCP/UDP"""
+    if ethertype == ETH_P_IPV4:
+        if len(frame) < offset + IPV4_HEADER.size:
+            return None
+        (version_ihl, _, _, _, fragment, _, proto, _,
+         src, dst) = IPV4_HEADER.unpack_from(frame, offset)
+        family = socket.AF_INET
+        # Порты есть только в первом фрагменте
+        first_fragment = not (fragment & 0x1FFF)
+        offset += (version_ihl & 0x0F) * 4
+    elif ethertype == ETH_P_IPV6:
+        if len(frame) < offset + IPV6_HEADER.size:
+            return None
+        _, _, proto, _, src, dst = IPV6_HEADER.unpack_from(frame, offset)
+        family = socket.AF_INET6
+        first_fragment = True
+        offset += IPV6_HEADER.size
+    else:
+        return None
+
+    record = {
+        'src_ip': socket.inet_ntop(family, src),
+        'dst_ip': socket.inet_ntop(family, dst),
+        'protocol': IP_PROTOCOLS.get(proto, 'unknown'),
+        'ip_proto': proto,
+        'src_port': 0,
+        'dst_port': 0,
+        'tcp_flags': 0,
+        'size': wire_length
+    }
+
+    if first_fragment and proto in (6, 17) and len(frame) >= offset + PORTS.size:
+        record['src_port'], record['dst_port'] = PORTS.unpack_from(frame, offset)
+        # Флаги TCP находятся в 13-м байте заголовка
+        if proto == 6 and len(frame) > offset + 13:
+            record['tcp_flags'] = frame[offset + 13]
+
+    return record
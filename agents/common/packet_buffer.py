@@ -0,0 +1,157 @@
+import asyncio
+from collections import deque
+from typing import Any, Dict, List, Optional
+import msgpack
+
+from agents.common.disk_queue import DiskQueue
+
+BUFFER_POLICIES = ('drop_oldest', 'drop_newest', 'sample', 'spill', 'block')
+
+class BoundedPacketBuffer:
+    """Ограниченный буфер записей агента с политикой переполнения.
+
+    Повторяет интерфейс ``asyncio.Queue``, который использует агент.
+    При заполнении буфера применяется политика:
+
+    * ``drop_oldest`` - вытесняется самая старая запись;
+    * ``drop_newest`` - отбрасывается новая запись;
+    * ``sample`` - принимается каждая N-я новая запись вместо самой старой;
+    * ``spill`` - новые записи вытесняются на диск и возвращаются в порядке поступления;
+    * ``block`` - производитель ждет освобождения места.
+
+    При вытеснении записи пишутся на диск пачками по ``spill_batch`` в
+    одну запись очереди и возвращаются в память по одной пачке за вызов,
+    поэтому ни запись, ни чтение не задерживают цикл событий надолго.
+    Число записей, оставшихся на диске от прошлого запуска, до их
+    возврата учитывается в ``qsize()`` приблизительно.
+    """
+
+    def __init__(self, capacity: int = 100000, policy: str = 'drop_oldest',
+                 sample_rate: int = 10, spill_queue: Optional[DiskQueue] = None,
+                 spill_batch: int = 1000):
+        if policy not in BUFFER_POLICIES:
+            raise ValueError(f"Неизвестная политика буфера: {policy}")
+        if policy == 'spill' and spill_queue is None:
+            raise ValueError("Для политики spill требуется дисковая очередь")
+        self.capacity = capacity
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self._items = deque()
+        self._spill = spill_queue if policy == 'spill' else None
+        self.spill_batch = spill_batch
+        self._spill_pending: List[Dict[str, Any]] = []  # неполная пачка, еще не записанная на диск
+        self._spilled = len(self._spill) if self._spill is not None else 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._overflow_seen = 0
+        self.stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'restored': 0
+        }
+
+    def qsize(self) -> int:
+        return len(self._items) + self._spilled
+
+    def empty(self) -> bool:
+        return not self._items and not self._spilling()
+
+    def full(self) -> bool:
+        return len(self._items) >= self.capacity
+
+    async def put(self, record: Dict[str, Any]):
+        """Добавление записи; ожидает только при политике block"""
+        if self.policy == 'block':
+            while self.full():
+                self._not_full.clear()
+                await self._not_full.wait()
+        self.put_nowait(record)
+
+    def _spilling(self) -> bool:
+        return self._spill is not None and (bool(self._spill_pending) or len(self._spill) > 0)
+
+    def put_nowait(self, record: Dict[str, Any]):
+        """Добавление записи без ожидания с применением политики переполнения"""
+        if self._spilling():
+            # Пока на диске есть записи, новые идут туда же, чтобы сохранить порядок
+            self._spill_record(record)
+        elif not self.full():
+            self._items.append(record)
+            self.stats['enqueued'] += 1
+        else:
+            self._overflow(record)
+        self._not_empty.set()
+
+    def _overflow(self, record: Dict[str, Any]):
+        if self.policy == 'drop_oldest':
+            self._items.popleft()
+            self._items.append(record)
+            self.stats['enqueued'] += 1
+            self.stats['dropped'] += 1
+        elif self.policy == 'sample':
+            self._overflow_seen += 1
+            if self._overflow_seen % self.sample_rate == 0:
+                self._items.popleft()
+                self._items.append(record)
+                self.stats['enqueued'] += 1
+            self.stats['dropped'] += 1
+        elif self.policy == 'spill':
+            self._spill_record(record)
+        else:
+            self.stats['dropped'] += 1
+
+    def _spill_record(self, record: Dict[str, Any]):
+        self._spill_pending.append(record)
+        self._spilled += 1
+        self.stats['spilled'] += 1
+        if len(self._spill_pending) >= self.spill_batch:
+            self._write_spill()
+
+    def _write_spill(self):
+        """Запись накопленной пачки одной записью дисковой очереди"""
+        if self._spill_pending:
+            self._spill.append(msgpack.packb(self._spill_pending, use_bin_type=True))
+            self._spill_pending = []
+
+    def get_nowait(self) -> Dict[str, Any]:
+        """Извлечение самой старой записи без ожидания"""
+        if not self._items and self._spilling():
+            self._restore()
+        if not self._items:
+            raise asyncio.QueueEmpty
+        record = self._items.popleft()
+        self._not_full.set()
+        return record
+
+    def _restore(self):
+        """Возврат в память одной пачки вытесненных записей: сначала с диска, затем неполной"""
+        data = self._spill.pop()
+        if data is not None:
+            records = msgpack.unpackb(data, raw=False)
+        else:
+            records, self._spill_pending = self._spill_pending, []
+        self._items.extend(records)
+        # Записи прошлого запуска учтены по одной на пачку, поэтому счетчик ограничен снизу
+        self._spilled = max(0, self._spilled - len(records)) if self._spilling() else 0
+        self.stats['restored'] += len(records)
+
+    async def get(self) -> Dict[str, Any]:
+        """Извлечение самой старой записи с ожиданием"""
+        while self.empty():
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def flush(self):
+        """Запись неполной пачки и сброс дисковой очереди вытеснения"""
+        if self._spill is not None:
+            self._write_spill()
+            self._spill.flush()
+
+    def close(self):
+        """Закрытие дисковой очереди вытеснения"""
+        if self._spill is not None:
+            self._write_spill()
+            self._spill.close()
@@ -0,0 +1,174 @@
+"""Потоковый протокол обмена между агентом и сервером.
+
+Каждый кадр состоит из заголовка фиксированной длины и зашифрованной
+полезной нагрузки::
+
+    +-------+---------+-------+----------------+------------------------+
+    | magic | version | flags | payload length | payload (Fernet)       |
+    | 2 B   | 1 B     | 1 B   | 4 B, BE        | msgpack-список записей |
+    +-------+---------+-------+----------------+------------------------+
+
+Один кадр несет батч записей, поэтому одно постоянное TCP-соединение
+передает десятки тысяч записей в секунду, а границы кадров не зависят
+от того, как TCP разбил поток на сегменты.
+
+Младшие биты ``flags`` задают алгоритм сжатия, которым сериализованный
+батч сжат перед шифрованием.
+"""
+import asyncio
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+import msgpack
+from cryptography.fernet import Fernet
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+MAGIC = b'NG'
+VERSION = 1
+HEADER = struct.Struct('!2sBBI')
+MAX_PAYLOAD_SIZE = 16 * 1024 * 1024
+
+COMPRESSION_MASK = 0x0F
+COMPRESSION_CODECS = {
+    'none': 0,
+    'zlib': 1,
+    'zstd': 2,
+    'lz4': 3
+}
+
+class FrameError(Exception):
+    """Нарушение формата кадра"""
+
+class RecordBatch:
+    """Батч записей, сериализуемый по мере добавления.
+
+    Размер батча в байтах известен точно, без повторной сериализации.
+    """
+
+    def __init__(self):
+        self._packer = msgpack.Packer(use_bin_type=True)
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add(self, record: Dict[str, Any]) -> int:
+        """Добавление записи, возвращает ее сериализованный размер"""
+        chunk = self._packer.pack(record)
+        self._chunks.append(chunk)
+        self.size += len(chunk)
+        return len(chunk)
+
+    def payload(self) -> bytes:
+        """Сериализованный батч в формате msgpack-массива"""
+        return self._packer.pack_array_header(len(self._chunks)) + b''.join(self._chunks)
+
+def pack_records(records: List[Dict[str, Any]]) -> bytes:
+    """Сериализация батча записей"""
+    return msgpack.packb(records, use_bin_type=True)
+
+def unpack_records(payload: bytes) -> List[Dict[str, Any]]:
+    """Десериализация батча записей"""
+    records = msgpack.unpackb(payload, raw=False)
+    if not isinstance(records, list):
+        raise FrameError("Полезная нагрузка кадра должна быть списком записей")
+    return records
+
+def check_compression(compression: str):
+    """Проверка, что алгоритм сжатия известен и доступен"""
+    if compression not in COMPRESSION_CODECS:
+        raise ValueError(f"Неизвестный алгоритм сжатия: {compression}")
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("Для сжатия zstd требуется пакет zstandard")
+    if compression == 'lz4' and lz4 is None:
+        raise ValueError("Для сжатия lz4 требуется пакет lz4")
+
+def compress(payload: bytes, compression: str) -> bytes:
+    """Сжатие сериализованного батча"""
+    if compression == 'zlib':
+        return zlib.compress(payload, 1)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=1).compress(payload)
+    if compression == 'lz4':
+        return lz4.frame.compress(payload)
+    return payload
+
+def decompress(data: bytes, flags: int) -> bytes:
+    """Распаковка полезной нагрузки по флагам кадра"""
+    codec = flags & COMPRESSION_MASK
+    if codec == COMPRESSION_CODECS['none']:
+        return data
+    if codec == COMPRESSION_CODECS['zlib']:
+        return zlib.decompress(data)
+    if codec == COMPRESSION_CODECS['zstd'] and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=MAX_PAYLOAD_SIZE * 8)
+    if codec == COMPRESSION_CODECS['lz4'] and lz4 is not None:
+        return lz4.frame.decompress(data)
+    raise FrameError(f"Неподдерживаемый алгоритм сжатия кадра: {codec}")
+
+def seal_payload(fernet: Fernet, payload: bytes, compression: str = 'none') -> bytes:
+    """Сжатие, шифрование и сборка кадра из сериализованного батча"""
+    token = fernet.encrypt(compress(payload, compression))
+    if len(token) > MAX_PAYLOAD_SIZE:
+        raise FrameError(f"Кадр превышает {MAX_PAYLOAD_SIZE} байт")
+    flags = COMPRESSION_CODECS[compression]
+    return HEADER.pack(MAGIC, VERSION, flags, len(token)) + token
+
+def encode_frame(fernet: Fernet, records: List[Dict[str, Any]], compression: str = 'none') -> bytes:
+    """Сборка кадра из батча записей"""
+    return seal_payload(fernet, pack_records(records), compression)
+
+def decode_header(header: bytes) -> Tuple[int, int]:
+    """Разбор заголовка кадра, возвращает (flags, длина полезной нагрузки)"""
+    magic, version, flags, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise FrameError("Неверная сигнатура кадра")
+    if version != VERSION:
+        raise FrameError(f"Неподдерживаемая версия протокола: {version}")
+    if length > MAX_PAYLOAD_SIZE:
+        raise FrameError(f"Слишком большой кадр: {length} байт")
+    return flags, length
+
+async def read_raw_frame(reader: asyncio.StreamReader) -> Optional[Tuple[int, bytes]]:
+    """Чтение одного кадра из потока без расшифровки.
+
+    Возвращает (flags, зашифрованная полезная нагрузка) или None, если
+    соединение закрыто между кадрами.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise FrameError("Соединение закрыто посреди заголовка кадра") from e
+
+    flags, length = decode_header(header)
+    try:
+        token = await reader.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        raise FrameError("Соединение закрыто посреди кадра") from e
+    return flags, token
+
+def open_frame(fernet: Fernet, flags: int, token: bytes) -> List[Dict[str, Any]]:
+    """Расшифровка, распаковка и десериализация полезной нагрузки кадра"""
+    return unpack_records(decompress(fernet.decrypt(token), flags))
+
+async def read_frame(reader: asyncio.StreamReader, fernet: Fernet) -> Optional[List[Dict[str, Any]]]:
+    """Чтение одного кадра из потока.
+
+    Возвращает None, если соединение закрыто между кадрами.
+    """
+    frame = await read_raw_frame(reader)
+    if frame is None:
+        return None
+    return open_frame(fernet, *frame)
@@ -0,0 +1,372 @@
+"""Бенчмарк горячих путей NetGuardian на синтетическом трафике.
+
+Измеряет пропускную способность и задержки (p50/p99):
+
+* analyzer - PacketAnalyzer.analyze_packet и analyze_batch на пакетах и потоках;
+* agent_encode - сборка батча из буфера и сжатие с шифрованием кадра,
+  как в BaseAgent._send_data_loop;
+* server_ingest - прием кадров NetGuardianServer через loopback-сокет,
+  от отправки агентом до стадии database;
+* alert_manager - AlertManager.process_alert с уведомлениями по email.
+
+Kafka, SMTP, Elasticsearch и PostgreSQL заменяются локальными
+заглушками (benchmarks/stand_ins.py), трафик - детерминированный
+(benchmarks/traffic.py). Результат пишется в JSON, чтобы сравнивать
+прогоны на разных коммитах.
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.bench_hot_paths --output bench.json
+    python -m benchmarks.bench_hot_paths --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import yaml
+from cryptography.fernet import Fernet
+
+from agents.common.protocol import encode_frame
+from benchmarks.stand_ins import LocalKafkaProducer, LocalSMTPPool, RecordingWriter, null_bulk
+from benchmarks.traffic import TrafficGenerator, parse_mix
+import server.core.alert_manager as alert_manager_module
+import server.core.server as server_module
+
+BENCHMARKS = ('analyzer', 'agent_encode', 'server_ingest', 'alert_manager')
+
+def summarize(latencies: List[float], items: int, elapsed: float, **extra) -> Dict[str, Any]:
+    """Пропускная способность (элементов/с) и перцентили задержки операции в мс"""
+    p50, p99 = np.percentile(latencies, [50, 99]) if latencies else (0.0, 0.0)
+    result = {
+        'items': items,
+        'operations': len(latencies),
+        'seconds': round(elapsed, 6),
+        'throughput': round(items / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(float(p50) * 1000, 4),
+        'p99_ms': round(float(p99) * 1000, 4)
+    }
+    result.update(extra)
+    return result
+
+def make_generator(args) -> TrafficGenerator:
+    return TrafficGenerator(
+        seed=args.seed, flows=args.flows, protocol_mix=args.protocol_mix,
+        scan_fraction=args.scan_fraction, burst_fraction=args.burst_fraction,
+        burst_size=args.burst_size
+    )
+
+def prepare_config(args) -> str:
+    """Временная конфигурация: уведомления только по email, без снимков модели"""
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    notifications = config['alerts']['notifications']
+    notifications['email']['enabled'] = True
+    notifications['slack']['enabled'] = False
+    notifications.setdefault('webhook', {})['enabled'] = False
+    config.setdefault('analyzer', {})['workers'] = args.analyzer_workers
+    # Каждый прогон начинается с необученной модели, снимки не читаются и не пишутся
+    config['analyzer']['snapshot'] = {'enabled': False}
+    config.setdefault('security', {})['encryption_key'] = Fernet.generate_key().decode()
+
+    fd, path = tempfile.mkstemp(prefix='netguardian-bench-', suffix='.yaml')
+    with os.fdopen(fd, 'w') as f:
+        yaml.safe_dump(config, f)
+    return path
+
+def install_stand_ins():
+    """Подмена клиентов внешних систем локальными заглушками"""
+    alert_manager_module.KafkaProducer = LocalKafkaProducer
+    alert_manager_module.SMTPConnectionPool = LocalSMTPPool
+    server_module.bulk = null_bulk
+
+def bench_analyzer(args) -> Dict[str, Dict]:
+    from server.core.packet_analyzer import PacketAnalyzer
+
+    results = {}
+    for feature_set in ('packet', 'flow'):
+        generator = make_generator(args)
+        produce = generator.packets if feature_set == 'packet' else generator.flow_records
+        warmup = produce(args.warmup)
+        records = produce(args.records)
+
+        # Модель обучается один раз на прогреве, замеры идут без переобучения
+        analyzer = PacketAnalyzer(
+            feature_set=feature_set, retrain_interval=len(warmup), background_training=False
+        )
+        analyzer.analyze_batch(warmup)
+        analyzer.retrain_interval = sys.maxsize
+
+        single = records[:args.single_records]
+        latencies = []
+        started = time.perf_counter()
+        for record in single:
+            began = time.perf_counter()
+            analyzer.analyze_packet(record)
+            latencies.append(time.perf_counter() - began)
+        results[f'analyzer.{feature_set}.analyze_packet'] = summarize(
+            latencies, len(single), time.perf_counter() - started
+        )
+
+        latencies = []
+        anomalies = 0
+        started = time.perf_counter()
+        for i in range(0, len(records), args.batch_size):
+            began = time.perf_counter()
+            result = analyzer.analyze_batch(records[i:i + args.batch_size])
+            latencies.append(time.perf_counter() - began)
+            anomalies += len(result.anomaly_indices)
+        results[f'analyzer.{feature_set}.analyze_batch'] = summarize(
+            latencies, len(records), time.perf_counter() - started,
+            batch_size=args.batch_size, anomalies=anomalies
+        )
+    return results
+
+def bench_agent_encode(args) -> Dict[str, Dict]:
+    from agents.common.base_agent import BaseAgent
+
+    records = make_generator(args).packets(args.records)
+    with tempfile.TemporaryDirectory(prefix='netguardian-bench-') as spool:
+        config = {
+            'agents': {
+                'id': 'bench',
+                'batch': {
+                    'max_records': args.frame_records, 'linger_ms': 0,
+                    'compression': args.compression
+                },
+                'buffer': {'capacity': len(records)},
+                'spool': {'directory': spool, 'fsync': 'never'}
+            }
+        }
+        agent = BaseAgent('tcp://127.0.0.1:9', Fernet.generate_key(), config)
+
+        async def run():
+            for record in records:
+                await agent.packet_buffer.put(record)
+            latencies = []
+            sent = 0
+            started = time.perf_counter()
+            while sent < len(records):
+                began = time.perf_counter()
+                batch = await agent._collect_batch()
+                agent._encode_batch(batch)
+                latencies.append(time.perf_counter() - began)
+                sent += len(batch)
+            return latencies, time.perf_counter() - started
+
+        try:
+            latencies, elapsed = asyncio.run(run())
+        finally:
+            agent.stop()
+
+    return {'agent.encode_batch': summarize(
+        latencies, len(records), elapsed, compression=args.compression,
+        compression_ratio=round(agent.stats['last_compression_ratio'], 3)
+    )}
+
+def bench_server_ingest(args, config_path: str) -> Dict[str, Dict]:
+    records = make_generator(args).packets(args.records)
+    server = server_module.NetGuardianServer(config_path)
+    sent_at: Dict[int, float] = {}
+    server.db_writer = RecordingWriter(sent_at)
+
+    frames = []
+    for number, i in enumerate(range(0, len(records), args.frame_records)):
+        chunk = records[i:i + args.frame_records]
+        for record in chunk:
+            record['bench_frame'] = number
+        frames.append(encode_frame(server.fernet, chunk, args.compression))
+
+    async def run():
+        for stage in server.stages.values():
+            stage.start()
+        server.alert_manager.start()
+        if server.analyzer_pool is not None:
+            server.analyzer_pool.start()
+        listener = await asyncio.start_server(server._handle_agent_connection, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(encode_frame(server.fernet, [{'type': 'hello', 'agent_id': 'bench'}]))
+
+        async def discard_acks():
+            # Подтверждения сервера читаются, чтобы не заполнить буфер сокета
+            while await reader.read(65536):
+                pass
+
+        acks = asyncio.create_task(discard_acks())
+
+        started = time.perf_counter()
+        for number, frame in enumerate(frames):
+            sent_at[number] = time.perf_counter()
+            writer.write(frame)
+            await writer.drain()
+        deadline = started + args.timeout
+        while server.db_writer.rows.get('events', 0) < len(records) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - started
+
+        writer.close()
+        acks.cancel()
+        listener.close()
+        for stage in server.stages.values():
+            await stage.stop(args.timeout)
+        await server.alert_manager.stop()
+        if server.analyzer_pool is not None:
+            server.analyzer_pool.shutdown()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    received = server.db_writer.rows.get('events', 0)
+    return {'server.ingest': summarize(
+        server.db_writer.latencies, received, elapsed, frames=len(frames),
+        frame_records=args.frame_records, complete=received == len(records)
+    )}
+
+def bench_alert_manager(args, config_path: str) -> Dict[str, Dict]:
+    from server.core.alert_manager import AlertManager
+
+    generator = make_generator(args)
+    reasons = ('Подозрительный протокол', 'Высокая частота соединений', 'Необычный размер пакета')
+    alerts = [
+        {
+            'type': 'anomaly',
+            'description': reasons[i % len(reasons)],
+            'source': {
+                'agent_id': 'bench',
+                'src_ip': packet['src_ip'],
+                'dst_ip': packet['dst_ip'],
+                'protocol': packet['protocol']
+            },
+            'score': -0.6,
+            'record': packet
+        }
+        for i, packet in enumerate(generator.packets(args.alerts))
+    ]
+    manager = AlertManager(config_path)
+
+    async def run():
+        manager.start()
+        latencies = []
+        started = time.perf_counter()
+        for alert in alerts:
+            began = time.perf_counter()
+            await manager.process_alert(alert)
+            latencies.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - started
+        # Уведомления, принятые до остановки, успевают уйти через пул SMTP
+        deadline = time.perf_counter() + args.timeout
+        while (any(not queue.empty() for queue in manager._notification_queues.values())
+               and time.perf_counter() < deadline):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        await manager.stop()
+        return latencies, elapsed
+
+    latencies, elapsed = asyncio.run(run())
+    stats = manager.get_stats()
+    return {'alert_manager.process_alert': summarize(
+        latencies, len(alerts), elapsed,
+        folded=stats['folded'],
+        kafka_sent=stats['kafka_sent'],
+        notifications_sent=stats['notifications_sent'],
+        notifications_dropped=stats['notifications_dropped'],
+        notifications_rate_limited=stats['notifications_rate_limited']
+    )}
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(results: Dict[str, Dict], baseline_path: str):
+    """Печать изменения пропускной способности и p99 относительно прошлого прогона"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nСравнение с {baseline_path} ({baseline.get('revision', 'unknown')}):")
+    print(f"{'benchmark':<36} {'throughput':>12} {'p99':>10}")
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        throughput = (result['throughput'] / before['throughput'] - 1) * 100 if before['throughput'] else 0.0
+        p99 = (result['p99_ms'] / before['p99_ms'] - 1) * 100 if before['p99_ms'] else 0.0
+        print(f"{name:<36} {throughput:>+11.1f}% {p99:>+9.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument('--config', default='config.example.yaml')
+    parser.add_argument('--output', help='файл для результатов в JSON (по умолчанию - stdout)')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--single-records', type=int, default=2000,
+                        help='записей для analyze_packet (по одной)')
+    parser.add_argument('--warmup', type=int, default=5000)
+    parser.add_argument('--alerts', type=int, default=20000)
+    parser.add_argument('--flows', type=int, default=1000)
+    parser.add_argument('--protocol-mix', type=parse_mix, default=None,
+                        help='доли протоколов, например tcp=0.8,udp=0.15,icmp=0.05')
+    parser.add_argument('--scan-fraction', type=float, default=0.02)
+    parser.add_argument('--burst-fraction', type=float, default=0.001)
+    parser.add_argument('--burst-size', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--frame-records', type=int, default=1000)
+    parser.add_argument('--compression', default='zlib')
+    parser.add_argument('--analyzer-workers', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120.0,
+                        help='максимум ожидания обработки всех записей в server_ingest')
+    args = parser.parse_args()
+
+    install_stand_ins()
+    config_path = prepare_config(args)
+    runners: Dict[str, Callable[[], Dict[str, Dict]]] = {
+        'analyzer': lambda: bench_analyzer(args),
+        'agent_encode': lambda: bench_agent_encode(args),
+        'server_ingest': lambda: bench_server_ingest(args, config_path),
+        'alert_manager': lambda: bench_alert_manager(args, config_path)
+    }
+
+    results: Dict[str, Dict] = {}
+    try:
+        for name in BENCHMARKS:
+            if name in args.only:
+                print(f"Running {name}...", file=sys.stderr)
+                results.update(runners[name]())
+    finally:
+        os.unlink(config_path)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'parameters': {
+            name: value for name, value in vars(args).items()
+            if name not in ('output', 'baseline', 'only')
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Бенчмарк счетчика частоты соединений.
+
+Сравнивает стоимость одного пакета для ConnectionRateTracker и прежней
+реализации на списках временных меток при росте интенсивности потока.
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.bench_rate_tracker
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from server.core.rate_tracker import ConnectionRateTracker
+
+class ListRateTracker:
+    """Прежний алгоритм PacketAnalyzer._get_connection_frequency"""
+
+    def __init__(self, window: float = 300.0):
+        self.window = timedelta(seconds=window)
+        self.history = defaultdict(list)
+
+    def hit(self, key, now: float) -> int:
+        now = timedelta(seconds=now)
+        self.history[key] = [ts for ts in self.history[key] if now - ts < self.window]
+        self.history[key].append(now)
+        return len(self.history[key])
+
+def run(tracker, rate: float, pairs: int, packets: int) -> float:
+    """Среднее время обработки пакета (мкс) при rate пакетов/с на пару"""
+    step = 1.0 / (rate * pairs)
+    keys = [(f"10.0.{i // 256}.{i % 256}", "192.168.0.1") for i in range(pairs)]
+
+    started = time.perf_counter()
+    now = 0.0
+    for i in range(packets):
+        tracker.hit(keys[i % pairs], now)
+        now += step
+    return (time.perf_counter() - started) / packets * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=10)
+    parser.add_argument('--packets', type=int, default=20_000)
+    parser.add_argument('--rates', type=float, nargs='+', default=[0.1, 1, 10, 100])
+    parser.add_argument('--skip-legacy', action='store_true',
+                        help='не измерять прежнюю реализацию (на высоких rate она очень медленная)')
+    args = parser.parse_args()
+
+    print(f"{'rate/pair':>10} {'tracker, us':>12} {'legacy, us':>12} {'pairs kept':>11}")
+    for rate in args.rates:
+        tracker = ConnectionRateTracker()
+        tracker_cost = run(tracker, rate, args.pairs, args.packets)
+        legacy_cost = float('nan')
+        if not args.skip_legacy:
+            legacy_cost = run(ListRateTracker(), rate, args.pairs, args.packets)
+        print(f"{rate:>10g} {tracker_cost:>12.2f} {legacy_cost:>12.2f} {len(tracker):>11}")
+
+if __name__ == '__main__':
+    main()
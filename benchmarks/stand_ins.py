@@ -0,0 +1,90 @@
+"""Локальные замены внешних систем для бенчмарков.
+
+Заменяют Kafka, SMTP-сервер, Elasticsearch и PostgreSQL так, чтобы
+измерялся код NetGuardian, а не сеть и чужие сервисы: вызовы принимаются
+сразу и только подсчитываются.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from server.core.smtp_pool import SMTPConnectionPool
+
+class LocalFuture:
+    """Результат send() продюсера: подтверждение доставки приходит сразу"""
+
+    def add_callback(self, callback: Callable, *args, **kwargs) -> 'LocalFuture':
+        callback(*args, None, **kwargs)
+        return self
+
+    def add_errback(self, errback: Callable, *args, **kwargs) -> 'LocalFuture':
+        return self
+
+class LocalKafkaProducer:
+    """Замена KafkaProducer: сериализует сообщение и подтверждает доставку"""
+
+    def __init__(self, value_serializer: Callable = None, **kwargs):
+        self.value_serializer = value_serializer or (lambda value: value)
+        self.messages = 0
+        self.bytes = 0
+
+    def send(self, topic: str, value: Any) -> LocalFuture:
+        self.bytes += len(self.value_serializer(value))
+        self.messages += 1
+        return LocalFuture()
+
+    def flush(self, timeout: float = None):
+        pass
+
+    def close(self, timeout: float = None):
+        pass
+
+class LocalSMTP:
+    """Замена соединения smtplib.SMTP"""
+
+    def __init__(self):
+        self.sent = 0
+
+    def noop(self) -> Tuple[int, bytes]:
+        return 250, b'OK'
+
+    def send_message(self, msg):
+        msg.as_bytes()
+        self.sent += 1
+
+    def quit(self):
+        pass
+
+class LocalSMTPPool(SMTPConnectionPool):
+    """Пул SMTP-соединений с локальными соединениями вместо сервера"""
+
+    def _connect(self) -> LocalSMTP:
+        return LocalSMTP()
+
+def null_bulk(client, actions: List[Dict]) -> Tuple[int, List]:
+    """Замена elasticsearch.helpers.bulk"""
+    return len(actions), []
+
+class RecordingWriter:
+    """Замена BulkWriter: считает строки и задержку записей от отправки агентом.
+
+    Время отправки кадра берется из ``sent_at`` по номеру кадра в поле
+    записи ``bench_frame``.
+    """
+
+    def __init__(self, sent_at: Dict[int, float]):
+        self.sent_at = sent_at
+        self.rows: Dict[str, int] = {}
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def create_schema(self):
+        pass
+
+    def write(self, table: str, records: List[Dict[str, Any]]) -> Tuple[int, float]:
+        now = time.perf_counter()
+        with self._lock:
+            self.rows[table] = self.rows.get(table, 0) + len(records)
+            if table == 'events':
+                self.latencies.extend(now - self.sent_at[record['bench_frame']] for record in records)
+        return len(records), 0.0
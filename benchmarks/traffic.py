@@ -0,0 +1,151 @@
+"""Детерминированный генератор синтетического трафика для бенчмарков.
+
+Записи имеют тот же вид, что и у агента: пакеты - как после разбора
+заголовков (agents/common/header_parser.py) с меткой времени, потоки -
+как экспорт FlowTable. При одинаковых параметрах и seed генератор
+выдает одну и ту же последовательность, поэтому результаты прогонов на
+разных коммитах сравнимы.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from agents.common.flow_table import FlowTable
+
+IP_PROTO_NUMBERS = {
+    'tcp': 6,
+    'udp': 17,
+    'icmp': 1
+}
+
+DEFAULT_PROTOCOL_MIX = {
+    'tcp': 0.8,
+    'udp': 0.15,
+    'icmp': 0.05
+}
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+TCP_PSH = 0x08
+
+# Синтетические часы начинаются с фиксированного момента, а не с текущего
+START_TIME = datetime(2024, 1, 1, 0, 0, 0)
+SCANNER_IP = '10.255.0.1'
+
+class TrafficGenerator:
+    """Синтетический трафик из пула потоков с редкими сканированиями и всплесками.
+
+    * ``flows`` - число постоянных потоков (5-кортежей); популярность
+      потоков неравномерна, небольшая их часть дает большую часть пакетов;
+    * ``protocol_mix`` - доли протоколов среди потоков;
+    * ``scan_fraction`` - доля пакетов сканирования портов: SYN без ответа
+      с одного адреса на последовательные порты разных хостов;
+    * ``burst_fraction`` и ``burst_size`` - вероятность начать всплеск и
+      его длина: пакеты одного потока почти без интервала;
+    * ``rate`` - средняя интенсивность в пакетах в секунду по
+      синтетическим часам.
+    """
+
+    def __init__(self, seed: int = 0, flows: int = 1000,
+                 protocol_mix: Optional[Dict[str, float]] = None, scan_fraction: float = 0.02,
+                 burst_fraction: float = 0.001, burst_size: int = 200, rate: float = 10000.0):
+        self.random = random.Random(seed)
+        self.protocol_mix = dict(protocol_mix or DEFAULT_PROTOCOL_MIX)
+        unknown = set(self.protocol_mix) - set(IP_PROTO_NUMBERS)
+        if unknown:
+            raise ValueError(f"Неизвестные протоколы: {', '.join(sorted(unknown))}")
+        self.scan_fraction = scan_fraction
+        self.burst_fraction = burst_fraction
+        self.burst_size = burst_size
+        self.interval = 1.0 / rate
+        self.flows = [self._make_flow() for _ in range(flows)]
+        self.clock = 0.0  # секунд от START_TIME
+        self._burst_flow: Optional[Dict[str, Any]] = None
+        self._burst_left = 0
+        self._scan_port = 1
+
+    def _make_flow(self) -> Dict[str, Any]:
+        names = list(self.protocol_mix)
+        protocol = self.random.choices(names, weights=[self.protocol_mix[n] for n in names])[0]
+        proto = IP_PROTO_NUMBERS[protocol]
+        return {
+            'src_ip': f"10.{self.random.randrange(256)}.{self.random.randrange(256)}.{self.random.randrange(1, 255)}",
+            'dst_ip': f"192.168.{self.random.randrange(256)}.{self.random.randrange(1, 255)}",
+            'protocol': protocol,
+            'ip_proto': proto,
+            'src_port': self.random.randrange(1024, 65536) if proto != 1 else 0,
+            'dst_port': self.random.choice((53, 80, 123, 443, 5432, 8080)) if proto != 1 else 0,
+            'mean_size': self.random.choice((64, 120, 576, 1200, 1500))
+        }
+
+    def _packet(self, flow: Dict[str, Any], size: int, tcp_flags: int) -> Dict[str, Any]:
+        return {
+            'src_ip': flow['src_ip'],
+            'dst_ip': flow['dst_ip'],
+            'protocol': flow['protocol'],
+            'ip_proto': flow['ip_proto'],
+            'src_port': flow['src_port'],
+            'dst_port': flow['dst_port'],
+            'tcp_flags': tcp_flags,
+            'size': size,
+            'timestamp': (START_TIME + timedelta(seconds=self.clock)).isoformat()
+        }
+
+    def _scan_packet(self) -> Dict[str, Any]:
+        self._scan_port = self._scan_port % 65535 + 1
+        target = {
+            'src_ip': SCANNER_IP,
+            'dst_ip': f"192.168.{self.random.randrange(4)}.{self.random.randrange(1, 255)}",
+            'protocol': 'tcp',
+            'ip_proto': 6,
+            'src_port': 40000,
+            'dst_port': self._scan_port
+        }
+        return self._packet(target, 60, TCP_SYN)
+
+    def next_packet(self) -> Dict[str, Any]:
+        """Следующий пакет; синтетические часы сдвигаются на интервал пакета"""
+        if self._burst_left:
+            self._burst_left -= 1
+            self.clock += self.interval / 100
+            flow = self._burst_flow
+            return self._packet(flow, flow['mean_size'], TCP_ACK | TCP_PSH if flow['ip_proto'] == 6 else 0)
+
+        self.clock += self.random.expovariate(1.0) * self.interval
+        roll = self.random.random()
+        if roll < self.scan_fraction:
+            return self._scan_packet()
+
+        # Квадрат равномерной величины смещает выбор к первым, "популярным" потокам
+        flow = self.flows[int(len(self.flows) * self.random.random() ** 2)]
+        if roll < self.scan_fraction + self.burst_fraction:
+            self._burst_flow = flow
+            self._burst_left = self.burst_size - 1
+
+        size = max(40, min(1500, int(self.random.gauss(flow['mean_size'], flow['mean_size'] / 4))))
+        return self._packet(flow, size, TCP_ACK if flow['ip_proto'] == 6 else 0)
+
+    def packets(self, count: int) -> List[Dict[str, Any]]:
+        """Список из count пакетов"""
+        return [self.next_packet() for _ in range(count)]
+
+    def flow_records(self, count: int, idle_timeout: float = 1.0,
+                     active_timeout: float = 5.0) -> List[Dict[str, Any]]:
+        """Список из count записей о потоках, собранных FlowTable из пакетов генератора"""
+        table = FlowTable(idle_timeout=idle_timeout, active_timeout=active_timeout)
+        epoch = START_TIME.timestamp()
+        records: List[Dict[str, Any]] = []
+        while len(records) < count:
+            for _ in range(1000):
+                packet = self.next_packet()
+                records.extend(table.add(packet, epoch + self.clock))
+            records.extend(table.expire(epoch + self.clock))
+        return records[:count]
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Доли протоколов из строки вида tcp=0.8,udp=0.15,icmp=0.05"""
+    mix = {}
+    for item in value.split(','):
+        name, _, share = item.partition('=')
+        mix[name.strip()] = float(share)
+    return mix
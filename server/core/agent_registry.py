@@ -0,0 +1,122 @@
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+ONLINE = 'online'
+OFFLINE = 'offline'
+
+# Служебные поля записей hello/heartbeat, которые не хранятся в реестре
+SERVICE_FIELDS = ('type', 'agent_id', 'timestamp')
+
+class AgentRegistry:
+    """Реестр агентов с инкрементальной записью в Redis.
+
+    Агент известен по постоянному идентификатору из приветствия (hello),
+    которое он отправляет при подключении, и подтверждает активность
+    heartbeat-записями каждые ``heartbeat_interval`` секунд. Агент, не
+    приславший ``missed_heartbeats`` сигналов подряд или закрывший
+    соединение, помечается offline; через ``retention`` секунд без
+    сигналов он забывается.
+
+    В Redis каждый агент - хэш ``<prefix>:<id>`` со значениями полей в
+    JSON, а сортированное множество ``<prefix>:changed`` хранит версию
+    последнего изменения каждого агента (миллисекунды, строго растут).
+    Изменения копятся в памяти, и записываются только изменившиеся поля,
+    одной транзакцией на пачку, поэтому чтение "изменения после версии"
+    видит пачку целиком. Хэши удаляются по TTL ``retention``.
+    """
+
+    def __init__(self, redis_client, heartbeat_interval: float = 30, missed_heartbeats: int = 3,
+                 retention: int = 86400, key_prefix: str = 'agent'):
+        self.redis = redis_client
+        self.timeout = heartbeat_interval * missed_heartbeats
+        self.retention = retention
+        self.key_prefix = key_prefix
+        self._agents: Dict[str, Dict[str, Any]] = {}  # последние записанные значения полей
+        self._last_seen: Dict[str, float] = {}  # момент последнего сигнала по monotonic
+        self._pending: Dict[str, Dict[str, Any]] = {}  # изменившиеся поля до записи
+        self._version = 0
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def online(self) -> int:
+        """Число агентов в состоянии online"""
+        return sum(1 for fields in self._agents.values() if fields.get('status') == ONLINE)
+
+    def register(self, agent_id: str, hello: Dict[str, Any], address: Optional[str] = None):
+        """Подключение агента по приветствию"""
+        now = datetime.now().isoformat()
+        fields = {name: value for name, value in hello.items() if name not in SERVICE_FIELDS}
+        fields.update(status=ONLINE, address=address, connected_at=now, last_seen=now)
+        self._last_seen[agent_id] = time.monotonic()
+        self._update(agent_id, fields)
+
+    def heartbeat(self, agent_id: str, record: Dict[str, Any]):
+        """Учет heartbeat-записи агента"""
+        fields = {name: value for name, value in record.items() if name not in SERVICE_FIELDS}
+        fields.update(status=ONLINE, last_seen=datetime.now().isoformat())
+        self._last_seen[agent_id] = time.monotonic()
+        self._update(agent_id, fields)
+
+    def disconnect(self, agent_id: str):
+        """Закрытие соединения агентом"""
+        if agent_id in self._agents:
+            self._update(agent_id, {'status': OFFLINE, 'disconnected_at': datetime.now().isoformat()})
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """Пометка offline агентов, пропустивших heartbeat; возвращает их идентификаторы"""
+        if now is None:
+            now = time.monotonic()
+        dead = []
+        for agent_id, last_seen in list(self._last_seen.items()):
+            silence = now - last_seen
+            if silence > self.retention:
+                # Хэш в Redis к этому времени удален по TTL
+                del self._last_seen[agent_id]
+                self._agents.pop(agent_id, None)
+            elif silence > self.timeout and self._agents[agent_id].get('status') == ONLINE:
+                self._update(agent_id, {'status': OFFLINE})
+                dead.append(agent_id)
+        return dead
+
+    def _update(self, agent_id: str, fields: Dict[str, Any]):
+        current = self._agents.setdefault(agent_id, {})
+        changed = {
+            name: value for name, value in fields.items()
+            if name not in current or current[name] != value
+        }
+        if changed:
+            current.update(changed)
+            self._pending.setdefault(agent_id, {}).update(changed)
+
+    def take(self) -> Dict[str, Dict[str, Any]]:
+        """Накопленные изменения (вызывается в цикле событий перед write)"""
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, pending: Dict[str, Dict[str, Any]]):
+        """Возврат изменений после неудачной записи; более новые значения сохраняются"""
+        for agent_id, fields in pending.items():
+            merged = dict(fields)
+            merged.update(self._pending.get(agent_id, {}))
+            self._pending[agent_id] = merged
+
+    def write(self, pending: Dict[str, Dict[str, Any]]):
+        """Запись изменений одной транзакцией Redis (блокирующая)"""
+        if not pending:
+            return
+        self._version = max(self._version + 1, int(time.time() * 1000))
+        changed_key = f"{self.key_prefix}:changed"
+
+        pipe = self.redis.pipeline(transaction=True)
+        for agent_id, fields in pending.items():
+            key = f"{self.key_prefix}:{agent_id}"
+            pipe.hset(key, mapping={
+                name: json.dumps(value, default=str) for name, value in fields.items()
+            })
+            pipe.expire(key, self.retention)
+        pipe.zadd(changed_key, {agent_id: self._version for agent_id in pending})
+        pipe.zremrangebyscore(changed_key, '-inf', self._version - self.retention * 1000)
+        pipe.execute()
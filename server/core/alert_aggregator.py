@@ -0,0 +1,89 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+class AlertAggregator:
+    """Свертка повторяющихся оповещений в инциденты.
+
+    Оповещения с одинаковым ключом (тип, источник, причина), пришедшие в
+    течение ``window`` секунд после первого, не порождают новых
+    оповещений: увеличивается счетчик ``count`` и обновляется
+    ``last_seen`` первого из них. По истечении окна инцидент закрывается,
+    и следующее такое оповещение открывает новый.
+
+    Окно отсчитывается от первого оповещения, поэтому порядок добавления
+    совпадает с порядком закрытия, и истекшие инциденты снимаются с
+    начала очереди. При превышении ``max_incidents`` досрочно
+    закрывается самый старый. Инцидент, истекший к приходу нового
+    оповещения с тем же ключом, закрывается в add() и возвращается
+    ближайшим вызовом expire() или flush().
+    """
+
+    def __init__(self, window: float = 60.0, max_incidents: int = 100000):
+        self.window = window
+        self.max_incidents = max_incidents
+        # ключ -> (момент закрытия по monotonic, оповещение)
+        self._incidents: 'OrderedDict[Hashable, Tuple[float, Dict]]' = OrderedDict()
+        self._closed: List[Dict] = []  # закрытые в add(), еще не возвращенные
+        self.folded = 0
+
+    def __len__(self) -> int:
+        return len(self._incidents)
+
+    @staticmethod
+    def key(alert: Dict) -> Hashable:
+        """Ключ свертки: тип, источник и причина оповещения"""
+        source = json.dumps(alert.get('source') or {}, sort_keys=True, default=str)
+        return (alert['type'], source, alert.get('description', ''))
+
+    def add(self, alert: Dict, now: Optional[float] = None) -> Tuple[Dict, bool]:
+        """Учет оповещения.
+
+        Возвращает (оповещение инцидента, новый ли это инцидент). Для
+        повтора возвращается ранее открытое оповещение с обновленными
+        счетчиками.
+        """
+        if now is None:
+            now = time.monotonic()
+        key = self.key(alert)
+
+        incident = self._incidents.get(key)
+        if incident is not None and now < incident[0]:
+            current = incident[1]
+            current['count'] += 1
+            current['last_seen'] = alert['timestamp']
+            current['severity'] = max(current['severity'], alert['severity'])
+            self.folded += 1
+            return current, False
+
+        if incident is not None:
+            del self._incidents[key]
+            if incident[1]['count'] > 1:
+                self._closed.append(incident[1])
+        alert['count'] = 1
+        alert['first_seen'] = alert['timestamp']
+        alert['last_seen'] = alert['timestamp']
+        self._incidents[key] = (now + self.window, alert)
+        return alert, True
+
+    def expire(self, now: Optional[float] = None) -> List[Dict]:
+        """Закрытие истекших инцидентов, возвращает свернувшие повторы"""
+        if now is None:
+            now = time.monotonic()
+        closed, self._closed = self._closed, []
+        while self._incidents:
+            deadline, alert = next(iter(self._incidents.values()))
+            if deadline > now and len(self._incidents) <= self.max_incidents:
+                break
+            self._incidents.popitem(last=False)
+            if alert['count'] > 1:
+                closed.append(alert)
+        return closed
+
+    def flush(self) -> List[Dict]:
+        """Закрытие всех инцидентов, возвращает свернувшие повторы"""
+        closed, self._closed = self._closed, []
+        closed.extend(alert for _, alert in self._incidents.values() if alert['count'] > 1)
+        self._incidents.clear()
+        return closed
@@ -1,21 +1,72 @@
-import smtplib
 import json
 import logging
+import uuid
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Dict, List
-import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 import yaml
 from datetime import datetime
 import asyncio
 from kafka import KafkaProducer
 
+from server.core.alert_aggregator import AlertAggregator
+from server.core.alert_store import AlertStore
+from server.core.http_pool import HTTPClientPool
+from server.core.smtp_pool import SMTPConnectionPool
+from server.core.token_bucket import TokenBucket
+
+# Максимум сообщений Kafka, передаваемых в поток отправки за раз
+KAFKA_SEND_BATCH = 500
+
 class AlertManager:
+    """Менеджер оповещений.
+
+    Прием оповещения не ждет внешних систем: сообщения для Kafka
+    попадают в ограниченную очередь, из которой их передает продюсеру
+    отдельный поток (send() может блокироваться до ``max_block_ms``), а
+    продюсер отправляет их батчами. Уведомления попадают в ограниченные
+    очереди каналов, которые разбирают отдельные задачи. Если Kafka или
+    канал не успевают, новые сообщения для них отбрасываются.
+    
+    Повторы одного инцидента в пределах окна свертки не отправляются:
+    у исходного оповещения растет ``count``, а при закрытии окна
+    оповещение с тем же ``id`` и итоговыми счетчиками повторно уходит в
+    Kafka. Частота уведомлений каждого канала ограничена ведром токенов.
+    """
+    
     def __init__(self, config_path: str):
         self.config = self._load_config(config_path)
         self.logger = logging.getLogger('AlertManager')
-        self.alert_history = []
+        history_config = self.config.get('history', {})
+        self.alert_history = AlertStore(
+            capacity=history_config.get('capacity', 10000),
+            retention=history_config.get('retention', 86400)
+        )
+        self.stats = {
+            'kafka_sent': 0,
+            'kafka_delivered': 0,
+            'kafka_failed': 0,
+            'kafka_dropped': 0,
+            'notifications_sent': 0,
+            'notifications_failed': 0,
+            'notifications_dropped': 0,
+            'notifications_rate_limited': 0
+        }
         self.kafka_producer = self._setup_kafka()
+        self._kafka_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='kafka-send')
+        self._kafka_queue: Optional[asyncio.Queue] = None
+        self.smtp_pool = self._setup_smtp_pool()
+        self.http_pool = self._setup_http_pool()
+        self.channels = self._setup_channels()
+        self.rate_limits = self._setup_rate_limits()
+        dedup_config = self.config.get('dedup', {})
+        self.aggregator = AlertAggregator(
+            window=dedup_config.get('window', 60),
+            max_incidents=dedup_config.get('max_incidents', 100000)
+        )
+        self._notification_queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: List[asyncio.Task] = []
         
     def _load_config(self, config_path: str) -> Dict:
         """Загрузка конфигурации"""
@@ -23,16 +74,122 @@ class AlertManager:
             return yaml.safe_load(f)['alerts']
             
     def _setup_kafka(self) -> KafkaProducer:
-        """Настройка Kafka продюсера"""
+        """Настройка Kafka продюсера.
+
+        Сообщения копятся в батчи до linger_ms и сжимаются целиком;
+        max_block_ms ограничивает блокировку send() при недоступном брокере.
+        """
+        kafka_config = self.config.get('kafka', {})
+        compression = kafka_config.get('compression_type', 'gzip')
         return KafkaProducer(
             bootstrap_servers=self.config.get('kafka_servers', ['localhost:9092']),
-            value_serializer=lambda v: json.dumps(v).encode('utf-8')
+            value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+            linger_ms=kafka_config.get('linger_ms', 50),
+            batch_size=kafka_config.get('batch_size', 65536),
+            compression_type=None if compression == 'none' else compression,
+            acks=kafka_config.get('acks', 1),
+            retries=kafka_config.get('retries', 3),
+            max_block_ms=kafka_config.get('max_block_ms', 100)
         )
         
-    async def process_alert(self, alert_data: Dict):
-        """Обработка оповещения"""
+    def _setup_smtp_pool(self) -> SMTPConnectionPool:
+        """Пул SMTP-соединений (None, если email-уведомления выключены)"""
+        email_config = self.config['notifications']['email']
+        if not email_config['enabled']:
+            return None
+        return SMTPConnectionPool(
+            email_config,
+            size=email_config.get('pool_size', 2),
+            idle_timeout=email_config.get('idle_timeout', 60)
+        )
+        
+    def _setup_http_pool(self) -> HTTPClientPool:
+        """Общий пул HTTP-соединений для Slack и вебхуков"""
+        http_config = self.config['notifications'].get('http', {})
+        return HTTPClientPool(
+            limit=http_config.get('limit', 100),
+            limit_per_host=http_config.get('limit_per_host', 10),
+            timeout=http_config.get('timeout', 10),
+            connect_timeout=http_config.get('connect_timeout', 5),
+            retries=http_config.get('retries', 3),
+            backoff_base=http_config.get('backoff_base', 0.5),
+            backoff_max=http_config.get('backoff_max', 10)
+        )
+        
+    def _setup_channels(self) -> Dict:
+        """Включенные каналы уведомлений"""
+        notifications = self.config['notifications']
+        channels = {}
+        if notifications['email']['enabled']:
+            channels['email'] = self._send_email_alert
+        if notifications['slack']['enabled']:
+            channels['slack'] = self._send_slack_alert
+        if notifications.get('webhook', {}).get('enabled'):
+            channels['webhook'] = self._send_webhook_alert
+        return channels
+        
+    def _setup_rate_limits(self) -> Dict[str, TokenBucket]:
+        """Ограничители частоты уведомлений по каналам"""
+        rate_limits = {}
+        for channel in self.channels:
+            channel_config = self.config['notifications'][channel]
+            rate_limits[channel] = TokenBucket(
+                rate=channel_config.get('rate_limit', 1.0),
+                burst=channel_config.get('burst', 10)
+            )
+        return rate_limits
+        
+    def start(self):
+        """Запуск обработчиков уведомлений и закрытия инцидентов (внутри цикла событий)"""
+        queue_size = self.config['notifications'].get('queue_size', 1000)
+        for channel, sender in self.channels.items():
+            self._notification_queues[channel] = asyncio.Queue(maxsize=queue_size)
+            # Для email по обработчику на соединение пула
+            if channel == 'email':
+                workers = self.smtp_pool.size
+            else:
+                workers = self.config['notifications'][channel].get('workers', 2)
+            self._tasks.extend(
+                asyncio.create_task(self._notification_worker(channel, sender))
+                for _ in range(workers)
+            )
+        self._kafka_queue = asyncio.Queue(maxsize=self.config.get('kafka', {}).get('queue_size', 10000))
+        self._tasks.append(asyncio.create_task(self._kafka_worker()))
+        self._tasks.append(asyncio.create_task(self._expire_loop()))
+            
+    async def stop(self):
+        """Остановка уведомлений и досылка накопленных сообщений Kafka"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        pending = []
+        if self._kafka_queue is not None:
+            while not self._kafka_queue.empty():
+                pending.append(self._kafka_queue.get_nowait())
+        pending.extend(self.aggregator.flush())
+        loop = asyncio.get_running_loop()
+        # Поток отправки один, поэтому остаток уходит после уже переданных пачек
+        await loop.run_in_executor(self._kafka_executor, self._produce, pending)
+        await loop.run_in_executor(self._kafka_executor, self.kafka_producer.flush, 10)
+        if self.smtp_pool is not None:
+            await loop.run_in_executor(None, self.smtp_pool.close)
+        await self.http_pool.close()
+            
+    def get_stats(self) -> Dict:
+        """Статистика отправки оповещений"""
+        stats = dict(self.stats)
+        stats['open_incidents'] = len(self.aggregator)
+        stats['folded'] = self.aggregator.folded
+        if self._kafka_queue is not None:
+            stats['kafka_queue'] = self._kafka_queue.qsize()
+        for channel, channel_queue in self._notification_queues.items():
+            stats[f'{channel}_queue'] = channel_queue.qsize()
+        return stats
+        
+    async def process_alert(self, alert_data: Dict) -> Dict:
+        """Обработка оповещения, возвращает оповещение инцидента, в который оно свернуто"""
         severity = self._calculate_severity(alert_data)
-        alert_id = f"alert_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        alert_id = f"alert_{uuid.uuid4().hex}"
         
         alert = {
             'id': alert_id,
@@ -44,15 +201,79 @@ class AlertManager:
             'data': alert_data
         }
         
-        self.alert_history.append(alert)
+        alert, is_new = self.aggregator.add(alert)
+        
+        # Закрытые инциденты, в том числе закрытый в add() новым оповещением,
+        # уходят в Kafka с итоговыми счетчиками
+        for closed in self.aggregator.expire():
+            self._send_to_kafka(closed)
+            
+        if not is_new:
+            self.alert_history.update(alert)
+            return alert
+            
+        self.alert_history.add(alert)
         
-        # Отправка в Kafka
-        self.kafka_producer.send('alerts', alert)
+        self._send_to_kafka(alert)
         
-        # Проверка пороговых значений и отправка уведомлений
+        # Проверка пороговых значений и постановка уведомлений в очереди каналов
         if severity >= self.config['thresholds'].get('notification_severity', 7):
-            await self._send_notifications(alert)
+            self._send_notifications(alert)
+            
+        return alert
+            
+    def query_alerts(self, limit: int = 50, offset: int = 0, min_severity: Optional[int] = None,
+                     alert_type: Optional[str] = None) -> Dict:
+        """Последние оповещения из истории в памяти (новые первыми)"""
+        return {
+            'total': self.alert_history.count(min_severity, alert_type),
+            'alerts': self.alert_history.query(
+                limit=limit, offset=offset, min_severity=min_severity, alert_type=alert_type
+            )
+        }
+        
+    def _send_to_kafka(self, alert: Dict):
+        """Постановка оповещения в очередь отправки в Kafka без ожидания"""
+        if not self._tasks:
+            self.start()
+        try:
+            # Копия: счетчики инцидента меняются в цикле событий, пока сообщение ждет отправки
+            self._kafka_queue.put_nowait(dict(alert))
+        except asyncio.QueueFull:
+            self.stats['kafka_dropped'] += 1
+            self.logger.warning(f"Kafka queue is full, alert {alert['id']} dropped")
+            
+    async def _kafka_worker(self):
+        """Передача сообщений из очереди продюсеру Kafka в потоке отправки"""
+        loop = asyncio.get_running_loop()
+        while True:
+            alerts = [await self._kafka_queue.get()]
+            while not self._kafka_queue.empty() and len(alerts) < KAFKA_SEND_BATCH:
+                alerts.append(self._kafka_queue.get_nowait())
+            await loop.run_in_executor(self._kafka_executor, self._produce, alerts)
             
+    def _produce(self, alerts: List[Dict]):
+        """Отправка сообщений без ожидания подтверждения брокера (в потоке отправки)"""
+        for alert in alerts:
+            try:
+                future = self.kafka_producer.send('alerts', alert)
+            except Exception as e:
+                self.stats['kafka_failed'] += 1
+                self.logger.error(f"Failed to send alert to Kafka: {str(e)}")
+                continue
+            self.stats['kafka_sent'] += 1
+            future.add_callback(self._on_kafka_delivery)
+            future.add_errback(self._on_kafka_error)
+        
+    def _on_kafka_delivery(self, metadata):
+        """Подтверждение доставки (вызывается из потока продюсера)"""
+        self.stats['kafka_delivered'] += 1
+        
+    def _on_kafka_error(self, error: Exception):
+        """Ошибка доставки после всех повторов (вызывается из потока продюсера)"""
+        self.stats['kafka_failed'] += 1
+        self.logger.error(f"Failed to deliver alert to Kafka: {str(error)}")
+        
     def _calculate_severity(self, alert_data: Dict) -> int:
         """Расчет уровня критичности оповещения"""
         base_severity = 5
@@ -72,20 +293,40 @@ class AlertManager:
             
         return min(base_severity, 10)  # Максимальный уровень - 10
         
-    async def _send_notifications(self, alert: Dict):
-        """Отправка уведомлений"""
-        tasks = []
-        
-        if self.config['notifications']['email']['enabled']:
-            tasks.append(self._send_email_alert(alert))
-            
-        if self.config['notifications']['slack']['enabled']:
-            tasks.append(self._send_slack_alert(alert))
+    def _send_notifications(self, alert: Dict):
+        """Постановка уведомлений в очереди каналов без ожидания отправки"""
+        if not self._tasks:
+            self.start()
             
-        await asyncio.gather(*tasks)
+        for channel, channel_queue in self._notification_queues.items():
+            if not self.rate_limits[channel].consume():
+                self.stats['notifications_rate_limited'] += 1
+                continue
+            try:
+                channel_queue.put_nowait(alert)
+            except asyncio.QueueFull:
+                self.stats['notifications_dropped'] += 1
+                self.logger.warning(f"Notification queue for {channel} is full, alert {alert['id']} dropped")
+                
+    async def _expire_loop(self):
+        """Периодическое закрытие инцидентов, по которым нет новых оповещений"""
+        while True:
+            await asyncio.sleep(1)
+            for alert in self.aggregator.expire():
+                self._send_to_kafka(alert)
+                
+    async def _notification_worker(self, channel: str, sender):
+        """Обработчик очереди уведомлений канала"""
+        channel_queue = self._notification_queues[channel]
+        while True:
+            alert = await channel_queue.get()
+            if await sender(alert):
+                self.stats['notifications_sent'] += 1
+            else:
+                self.stats['notifications_failed'] += 1
         
-    async def _send_email_alert(self, alert: Dict):
-        """Отправка уведомления по email"""
+    async def _send_email_alert(self, alert: Dict) -> bool:
+        """Отправка уведомления по email через пул соединений"""
         email_config = self.config['notifications']['email']
         
         msg = MIMEMultipart()
@@ -97,32 +338,30 @@ class AlertManager:
         msg.attach(MIMEText(body, 'html'))
         
         try:
-            with smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port']) as server:
-                server.starttls()
-                server.login(email_config['username'], email_config['password'])
-                server.send_message(msg)
+            await asyncio.wrap_future(self.smtp_pool.submit(msg))
+            return True
         except Exception as e:
             self.logger.error(f"Failed to send email alert: {str(e)}")
+            return False
             
-    async def _send_slack_alert(self, alert: Dict):
+    async def _send_slack_alert(self, alert: Dict) -> bool:
         """Отправка уведомления в Slack"""
         slack_config = self.config['notifications']['slack']
         
         message = self._format_slack_message(alert)
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    slack_config['webhook_url'],
-                    json={'text': message}
-                ) as response:
-                    if response.status != 200:
-                        self.logger.error(
-                            f"Failed to send Slack alert: {await response.text()}"
-                        )
-        except Exception as e:
-            self.logger.error(f"Failed to send Slack alert: {str(e)}")
-            
+        return await self.http_pool.post_json(slack_config['webhook_url'], {'text': message})
+        
+    async def _send_webhook_alert(self, alert: Dict) -> bool:
+        """Отправка оповещения в формате JSON на настроенные вебхуки"""
+        webhook_config = self.config['notifications']['webhook']
+        headers = webhook_config.get('headers', {})
+        
+        results = await asyncio.gather(*(
+            self.http_pool.post_json(url, alert, headers) for url in webhook_config['urls']
+        ))
+        return all(results)
+        
     def _format_alert_email(self, alert: Dict) -> str:
         """Форматирование email сообщения"""
         return f"""
@@ -0,0 +1,172 @@
+import heapq
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+class AlertStore:
+    """Ограниченное хранилище последних оповещений в памяти.
+
+    Оповещения лежат в кольцевом буфере на ``capacity`` элементов и
+    нумеруются сквозным номером ``seq``, поэтому порядок номеров совпадает
+    с порядком времени. Для каждого уровня критичности и каждого типа
+    хранится отсортированный список номеров, а время добавления - рядом
+    с буфером, так что выборка последних N оповещений с фильтрами стоит
+    O(N log k), а поиск границы по времени - O(log n).
+
+    Оповещения старше ``retention`` секунд и вытесненные из буфера
+    удаляются с начала; индексы подчищаются лениво.
+    """
+
+    def __init__(self, capacity: int = 10000, retention: float = 86400.0):
+        self.capacity = capacity
+        self.retention = retention
+        self._alerts: List[Optional[Dict]] = [None] * capacity
+        self._times: List[float] = [0.0] * capacity
+        self._severities: List[int] = [0] * capacity  # критичность, под которой оповещение в индексе
+        self._head = 0  # номер самого старого оповещения
+        self._tail = 0  # номер следующего оповещения
+        self._by_severity: Dict[int, List[int]] = {}
+        self._by_type: Dict[str, List[int]] = {}
+        self._severity_counts: Counter = Counter()
+        self._type_counts: Counter = Counter()
+        self._seq_by_id: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    def _get(self, seq: int) -> Dict:
+        return self._alerts[seq % self.capacity]
+
+    def add(self, alert: Dict, now: Optional[float] = None):
+        """Добавление оповещения"""
+        if now is None:
+            now = time.time()
+        if len(self) == self.capacity:
+            self._evict_oldest()
+
+        seq = self._tail
+        slot = seq % self.capacity
+        self._alerts[slot] = alert
+        self._times[slot] = now
+        self._severities[slot] = alert['severity']
+        self._tail += 1
+
+        self._by_severity.setdefault(alert['severity'], []).append(seq)
+        self._by_type.setdefault(alert['type'], []).append(seq)
+        self._severity_counts[alert['severity']] += 1
+        self._type_counts[alert['type']] += 1
+        self._seq_by_id[alert['id']] = seq
+        self.expire(now)
+
+    def update(self, alert: Dict):
+        """Переиндексация оповещения после свертки повторов (критичность могла вырасти)"""
+        seq = self._seq_by_id.get(alert['id'])
+        if seq is None:
+            return
+        slot = seq % self.capacity
+        old_severity = self._severities[slot]
+        if alert['severity'] == old_severity:
+            return
+        # Старая запись индекса остается и отфильтровывается при чтении
+        insort(self._by_severity.setdefault(alert['severity'], []), seq)
+        self._severity_counts[old_severity] -= 1
+        self._severity_counts[alert['severity']] += 1
+        self._severities[slot] = alert['severity']
+
+    def expire(self, now: Optional[float] = None):
+        """Удаление оповещений старше retention"""
+        if now is None:
+            now = time.time()
+        cutoff = now - self.retention
+        while self._head < self._tail and self._times[self._head % self.capacity] < cutoff:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        slot = self._head % self.capacity
+        alert = self._alerts[slot]
+        self._alerts[slot] = None
+        self._head += 1
+        self._severity_counts[self._severities[slot]] -= 1
+        self._type_counts[alert['type']] -= 1
+        self._seq_by_id.pop(alert['id'], None)
+        self._trim(self._by_severity)
+        self._trim(self._by_type)
+
+    def _trim(self, index: Dict):
+        """Ленивая очистка индекса: устаревшие номера удаляются пачкой"""
+        for key, seqs in list(index.items()):
+            if not seqs or seqs[-1] < self._head:
+                del index[key]
+            elif seqs[0] < self._head and len(seqs) > 64:
+                stale = bisect_left(seqs, self._head)
+                if stale * 2 >= len(seqs):
+                    del seqs[:stale]
+
+    def _seq_at(self, timestamp: float) -> int:
+        """Номер первого оповещения, добавленного не раньше timestamp"""
+        low, high = self._head, self._tail
+        while low < high:
+            middle = (low + high) // 2
+            if self._times[middle % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _newest_in(self, seqs: List[int], severity: Optional[int] = None) -> Iterator[int]:
+        """Номера индекса от новых к старым, в пределах буфера"""
+        for seq in reversed(seqs):
+            if seq < self._head:
+                return
+            if severity is None or self._severities[seq % self.capacity] == severity:
+                yield seq
+
+    def _candidates(self, min_severity: Optional[int], alert_type: Optional[str]) -> Iterator[int]:
+        if alert_type is not None:
+            return self._newest_in(self._by_type.get(alert_type, []))
+        if min_severity is not None:
+            return heapq.merge(*(
+                self._newest_in(seqs, severity)
+                for severity, seqs in self._by_severity.items() if severity >= min_severity
+            ), reverse=True)
+        return iter(range(self._tail - 1, self._head - 1, -1))
+
+    def query(self, limit: int = 50, offset: int = 0, min_severity: Optional[int] = None,
+              alert_type: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None) -> List[Dict]:
+        """Последние оповещения (новые первыми) с фильтрами по критичности, типу и времени"""
+        self.expire()
+        lower = self._seq_at(since) if since is not None else self._head
+        upper = self._seq_at(until) if until is not None else self._tail
+
+        result = []
+        for seq in self._candidates(min_severity, alert_type):
+            if seq >= upper:
+                continue
+            if seq < lower or len(result) >= limit:
+                break
+            alert = self._get(seq)
+            if min_severity is not None and alert['severity'] < min_severity:
+                continue
+            if offset:
+                offset -= 1
+                continue
+            result.append(alert)
+        return result
+
+    def count(self, min_severity: Optional[int] = None, alert_type: Optional[str] = None) -> int:
+        """Число оповещений в хранилище, подходящих под фильтры"""
+        self.expire()
+        if alert_type is not None and min_severity is not None:
+            return sum(
+                1 for seq in self._newest_in(self._by_type.get(alert_type, []))
+                if self._get(seq)['severity'] >= min_severity
+            )
+        if alert_type is not None:
+            return self._type_counts[alert_type]
+        if min_severity is not None:
+            return sum(
+                count for severity, count in self._severity_counts.items() if severity >= min_severity
+            )
+        return len(self)
@@ -0,0 +1,193 @@
+import csv
+import io
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+from psycopg2.extras import execute_values
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        ts timestamp NOT NULL,
+        agent_id text,
+        type text,
+        src_ip text,
+        dst_ip text,
+        src_port integer,
+        dst_port integer,
+        protocol text,
+        bytes bigint,
+        packets integer
+    ) PARTITION BY RANGE (ts)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS alerts (
+        ts timestamp NOT NULL,
+        id text NOT NULL,
+        type text,
+        severity smallint,
+        description text,
+        count integer,
+        last_seen timestamp,
+        source jsonb,
+        data jsonb,
+        PRIMARY KEY (id, ts)
+    ) PARTITION BY RANGE (ts)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS system_stats (
+        ts timestamp NOT NULL,
+        agent_id text,
+        cpu_percent real,
+        memory_percent real,
+        disk_usage real,
+        bytes_sent bigint,
+        bytes_recv bigint
+    ) PARTITION BY RANGE (ts)
+    """
+)
+
+COLUMNS = {
+    'events': ('ts', 'agent_id', 'type', 'src_ip', 'dst_ip', 'src_port', 'dst_port',
+               'protocol', 'bytes', 'packets'),
+    'alerts': ('ts', 'id', 'type', 'severity', 'description', 'count', 'last_seen',
+               'source', 'data'),
+    'system_stats': ('ts', 'agent_id', 'cpu_percent', 'memory_percent', 'disk_usage',
+                     'bytes_sent', 'bytes_recv')
+}
+
+class BulkWriter:
+    """Пакетная запись событий, оповещений и системных метрик в PostgreSQL.
+
+    Таблицы секционированы по суткам (``PARTITION BY RANGE (ts)``), секции
+    создаются при первой записи за день, поэтому старые данные удаляются
+    отбрасыванием секции, а не DELETE. События и метрики пишутся одним
+    COPY на пачку; оповещения - многострочным INSERT с обновлением
+    счетчиков свернутых повторов (ON CONFLICT). Методы блокирующие и
+    вызываются из пула потоков; соединения берутся из пула ``db_engine``.
+    Если схему не удалось создать при запуске, попытка повторяется при
+    каждой записи до успеха.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._partitions: Dict[str, set] = defaultdict(set)  # таблица -> созданные дни
+        self._partition_lock = threading.Lock()
+        self._schema_ready = False
+
+    def create_schema(self):
+        """Создание секционированных таблиц"""
+        self._execute(SCHEMA)
+        self._schema_ready = True
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        with self._partition_lock:
+            if not self._schema_ready:
+                self.create_schema()
+
+    def _execute(self, statements):
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _ensure_partitions(self, table: str, rows: List[Tuple]):
+        """Создание суточных секций для дат пачки, которых еще нет"""
+        days = {row[0][:10] for row in rows} - self._partitions[table]
+        if not days:
+            return
+        with self._partition_lock:
+            statements = []
+            for day in sorted(days):
+                start = datetime.strptime(day, '%Y-%m-%d')
+                statements.append(
+                    f"CREATE TABLE IF NOT EXISTS {table}_{start:%Y%m%d} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{start + timedelta(days=1):%Y-%m-%d}')"
+                )
+            self._execute(statements)
+            self._partitions[table].update(days)
+
+    def write(self, table: str, records: List[Dict[str, Any]]) -> Tuple[int, float]:
+        """Запись пачки в таблицу, возвращает (число строк, длительность в секундах)"""
+        rows = [ROW_BUILDERS[table](record) for record in records]
+        if table == 'alerts':
+            # Повторы одного инцидента в пачке - одна строка с последними счетчиками
+            rows = list({row[1]: row for row in rows}.values())
+        if not rows:
+            return 0, 0.0
+
+        started = time.perf_counter()
+        self._ensure_schema()
+        self._ensure_partitions(table, rows)
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                if table == 'alerts':
+                    self._upsert_alerts(cursor, rows)
+                else:
+                    self._copy(cursor, table, rows)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        return len(rows), time.perf_counter() - started
+
+    @staticmethod
+    def _copy(cursor, table: str, rows: List[Tuple]):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(COLUMNS[table])}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+
+    @staticmethod
+    def _upsert_alerts(cursor, rows: List[Tuple]):
+        execute_values(
+            cursor,
+            f"INSERT INTO alerts ({', '.join(COLUMNS['alerts'])}) VALUES %s "
+            "ON CONFLICT (id, ts) DO UPDATE SET "
+            "count = EXCLUDED.count, last_seen = EXCLUDED.last_seen, severity = EXCLUDED.severity",
+            rows,
+            page_size=len(rows)
+        )
+
+def _event_row(record: Dict[str, Any]) -> Tuple:
+    if record.get('type') == 'flow':
+        timestamp = datetime.fromtimestamp(record['last_seen']).isoformat()
+        size, packets = record.get('bytes'), record.get('packets')
+    else:
+        timestamp = record.get('timestamp') or datetime.now().isoformat()
+        size, packets = record.get('size'), 1
+    return (timestamp, record.get('agent_id'), record.get('type', 'packet'),
+            record.get('src_ip'), record.get('dst_ip'), record.get('src_port'),
+            record.get('dst_port'), record.get('protocol'), size, packets)
+
+def _alert_row(alert: Dict[str, Any]) -> Tuple:
+    return (alert['timestamp'], alert['id'], alert['type'], alert['severity'],
+            alert['description'], alert.get('count', 1), alert.get('last_seen', alert['timestamp']),
+            json.dumps(alert['source'], default=str), json.dumps(alert['data'], default=str))
+
+def _system_stats_row(record: Dict[str, Any]) -> Tuple:
+    stats = record.get('data', {})
+    network = stats.get('network_io') or {}
+    return (stats.get('timestamp') or datetime.now().isoformat(), record.get('agent_id'),
+            stats.get('cpu_percent'), stats.get('memory_percent'), stats.get('disk_usage'),
+            network.get('bytes_sent'), network.get('bytes_recv'))
+
+ROW_BUILDERS = {
+    'events': _event_row,
+    'alerts': _alert_row,
+    'system_stats': _system_stats_row
+}
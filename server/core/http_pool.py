@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+import random
+from typing import Any, Dict, Optional
+import aiohttp
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class HTTPClientPool:
+    """Общий пул HTTP-соединений для уведомлений.
+
+    Одна долгоживущая сессия aiohttp переиспользует keep-alive соединения
+    и TLS-сессии между запросами; число соединений ограничено в целом и
+    на каждый хост. Неудачные запросы (ошибки соединения, таймауты,
+    ответы 429 и 5xx) повторяются до ``retries`` раз с экспоненциальной
+    задержкой и случайным разбросом (full jitter), чтобы повторы многих
+    уведомлений не приходили на сервис одновременно.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, timeout: float = 10.0,
+                 connect_timeout: float = 5.0, retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 10.0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.logger = logging.getLogger('AlertManager')
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Сессия создается при первом запросе, внутри цикла событий"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300
+                ),
+                timeout=self.timeout
+            )
+        return self._session
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def post_json(self, url: str, payload: Any, headers: Optional[Dict[str, str]] = None) -> bool:
+        """POST JSON с повторами; True при успешном ответе"""
+        body = json.dumps(payload, default=str)
+        request_headers = {'Content-Type': 'application/json'}
+        request_headers.update(headers or {})
+
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                async with self.session.post(url, data=body, headers=request_headers) as response:
+                    if response.status < 300:
+                        return True
+                    error = f"HTTP {response.status}: {await response.text()}"
+                    if response.status not in RETRY_STATUSES:
+                        self.logger.error(f"Request to {url} failed: {error}")
+                        return False
+                    retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+
+            if attempt < self.retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        self.logger.error(f"Request to {url} failed after {self.retries + 1} attempts: {error}")
+        return False
+
+    async def close(self):
+        """Закрытие сессии и соединений"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,83 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Разрешения агрегатов: имя -> ширина корзины в секундах
+RESOLUTIONS = {
+    '1m': 60,
+    '1h': 3600,
+    '1d': 86400
+}
+
+DEFAULT_RETENTION = {
+    '1m': 86400,
+    '1h': 8 * 86400,
+    '1d': 400 * 86400
+}
+
+class MetricRollups:
+    """Агрегаты системных метрик агентов по корзинам 1m/1h/1d в Redis.
+
+    Каждая корзина - небольшой хэш ``<prefix>:<разрешение>:<начало корзины>``
+    с суммами и счетчиками (``cpu_sum``, ``cpu_count``, ``memory_sum``,
+    ``memory_count``, ``net_sent``), из которых среднее и сумма за любой
+    период собираются без обхода исходных документов. Приращения
+    накапливаются в памяти и записываются пачкой одной транзакцией Redis,
+    поэтому после неудачной записи их можно вернуть (restore) без
+    двойного учета; корзины удаляются по TTL своего разрешения.
+    """
+
+    def __init__(self, redis_client, retention: Optional[Dict[str, int]] = None,
+                 key_prefix: str = 'rollup'):
+        self.redis = redis_client
+        self.retention = dict(DEFAULT_RETENTION)
+        self.retention.update(retention or {})
+        self.key_prefix = key_prefix
+        self._pending: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def add(self, stats: Dict[str, Any]):
+        """Учет одного снимка system_stats от агента"""
+        try:
+            timestamp = datetime.fromisoformat(stats['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            timestamp = time.time()
+
+        cpu = stats.get('cpu_percent')
+        memory = stats.get('memory_percent')
+        sent = (stats.get('network_io') or {}).get('bytes_sent')
+
+        for name, width in RESOLUTIONS.items():
+            fields = self._pending[f"{self.key_prefix}:{name}:{int(timestamp // width * width)}"]
+            if cpu is not None:
+                fields['cpu_sum'] += cpu
+                fields['cpu_count'] += 1
+            if memory is not None:
+                fields['memory_sum'] += memory
+                fields['memory_count'] += 1
+            if sent is not None:
+                fields['net_sent'] += sent
+
+    def take(self) -> Dict[str, Dict[str, float]]:
+        """Накопленные приращения (вызывается в цикле событий перед write)"""
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(float))
+        return pending
+
+    def restore(self, pending: Dict[str, Dict[str, float]]):
+        """Возврат приращений после неудачной записи; складываются с накопленными с тех пор"""
+        for key, fields in pending.items():
+            current = self._pending[key]
+            for field, value in fields.items():
+                current[field] += value
+
+    def write(self, pending: Dict[str, Dict[str, float]]):
+        """Запись приращений одной транзакцией Redis (блокирующая)"""
+        if not pending:
+            return
+        pipe = self.redis.pipeline(transaction=True)
+        for key, fields in pending.items():
+            for field, value in fields.items():
+                pipe.hincrbyfloat(key, field, value)
+            resolution = key.rsplit(':', 2)[1]
+            pipe.expire(key, self.retention[resolution])
+        pipe.execute()
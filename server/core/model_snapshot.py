@@ -0,0 +1,95 @@
+"""Снимки обученной модели PacketAnalyzer на диске.
+
+Снимок - отдельный каталог ``snapshot-<время в мс>`` внутри каталога
+анализатора::
+
+    meta.json    версия формата, набор признаков, версия scikit-learn
+    model.pkl    пара (StandardScaler, IsolationForest)
+    window.npy   обучающие данные модели, загружаются через mmap
+
+Файл ``CURRENT`` содержит имя последнего полного снимка и заменяется
+атомарно (os.replace) после записи всех файлов, поэтому прерванная
+запись не портит предыдущий снимок. Старые снимки удаляются.
+"""
+import json
+import os
+import pickle
+import shutil
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import sklearn
+
+# 2: из признаков пакетов удален summary_length
+SNAPSHOT_VERSION = 2
+CURRENT = 'CURRENT'
+KEEP_SNAPSHOTS = 2
+
+class SnapshotError(Exception):
+    """Снимок несовместим с текущей версией формата или библиотек"""
+
+def save_snapshot(directory: str, model: Tuple, training_data: np.ndarray,
+                  meta: Dict[str, Any]) -> str:
+    """Запись снимка в новый каталог и переключение CURRENT на него"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"snapshot-{int(time.time() * 1000)}"
+    path = os.path.join(directory, name)
+    staging = f"{path}.tmp"
+    os.makedirs(staging)
+
+    with open(os.path.join(staging, 'model.pkl'), 'wb') as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    np.save(os.path.join(staging, 'window.npy'), np.ascontiguousarray(training_data))
+    meta = dict(meta, version=SNAPSHOT_VERSION, sklearn_version=sklearn.__version__,
+                created_at=time.time(), rows=len(training_data))
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    os.rename(staging, path)
+
+    current = os.path.join(directory, CURRENT)
+    with open(f"{current}.tmp", 'w') as f:
+        f.write(name)
+    os.replace(f"{current}.tmp", current)
+    _remove_old(directory, name)
+    return path
+
+def _remove_old(directory: str, current: str):
+    """Удаление старых снимков и остатков прерванных записей.
+
+    Отображенные в память файлы удаленного снимка остаются доступны
+    открывшему их процессу до закрытия.
+    """
+    names = sorted(name for name in os.listdir(directory) if name.startswith('snapshot-'))
+    complete = [name for name in names if not name.endswith('.tmp')]
+    stale = [name for name in names if name.endswith('.tmp')]
+    stale += [name for name in complete[:-KEEP_SNAPSHOTS] if name != current]
+    for name in stale:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+def load_snapshot(directory: str) -> Optional[Tuple[Dict[str, Any], Tuple, np.ndarray]]:
+    """Последний снимок: (метаданные, модель, обучающие данные); None, если снимков нет.
+
+    Обучающие данные отображаются в память в режиме копирования при
+    записи: страницы читаются с диска по мере обращения, а изменения не
+    попадают в файл.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT)) as f:
+            path = os.path.join(directory, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != SNAPSHOT_VERSION:
+        raise SnapshotError(f"версия формата {meta.get('version')}, ожидается {SNAPSHOT_VERSION}")
+    if meta.get('sklearn_version') != sklearn.__version__:
+        raise SnapshotError(
+            f"снимок создан scikit-learn {meta.get('sklearn_version')}, установлен {sklearn.__version__}"
+        )
+
+    with open(os.path.join(path, 'model.pkl'), 'rb') as f:
+        model = pickle.load(f)
+    training_data = np.load(os.path.join(path, 'window.npy'), mmap_mode='c')
+    return meta, model, training_data
@@ -1,108 +1,412 @@
+import logging
+import os
+import threading
+import time
 import numpy as np
-from typing import Dict, List, Tuple
-from datetime import datetime, timedelta
-from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from datetime import datetime
 import pandas as pd
 from sklearn.ensemble import IsolationForest
+from sklearn.exceptions import NotFittedError
 from sklearn.preprocessing import StandardScaler
 
+from server.core import model_snapshot
+from server.core.rate_tracker import ConnectionRateTracker
+from server.core.training_window import StratifiedTrainingWindow, TrainingWindow
+
+# Порядок столбцов в матрице признаков
+FEATURE_NAMES = ('size', 'protocol_score', 'time_score', 'connection_rate')
+N_FEATURES = len(FEATURE_NAMES)
+
+# Признаки агрегированных потоков (записи агента с type == 'flow')
+FLOW_FEATURE_NAMES = (
+    'bytes', 'packets', 'duration', 'bytes_per_packet',
+    'protocol_score', 'time_score', 'connection_rate', 'syn_only'
+)
+
+FEATURE_SETS = {
+    'packet': FEATURE_NAMES,
+    'flow': FLOW_FEATURE_NAMES
+}
+
+# Признаки, по которым можно стратифицировать обучающее окно,
+# и число различных значений в каждом из них
+STRATIFY_FEATURES = {
+    'protocol': ('protocol_score', 4),
+    'time': ('time_score', 3)
+}
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+# Насколько оценка ниже порога, чтобы считать паттерн крайне подозрительным
+EXTREME_ANOMALY_MARGIN = 0.3
+
+# Соединений пары за окно счетчика, начиная с которых частота считается высокой
+HIGH_CONNECTION_COUNT = 100
+
+PROTOCOL_RISK_SCORES = {
+    'tcp': 1.0,
+    'udp': 2.0,
+    'icmp': 3.0,
+    'unknown': 5.0
+}
+
+class BatchResult:
+    """Результат пакетного анализа.
+
+    Флаги и оценки возвращаются массивами NumPy, а причины аномалий
+    вычисляются только при первом обращении к ним.
+    """
+
+    def __init__(self, analyzer: 'PacketAnalyzer', features: np.ndarray,
+                 is_anomaly: np.ndarray, scores: np.ndarray):
+        self._analyzer = analyzer
+        self.features = features
+        self.is_anomaly = is_anomaly
+        self.scores = scores
+        self._reasons: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @property
+    def anomaly_indices(self) -> np.ndarray:
+        """Индексы пакетов, признанных аномальными"""
+        return np.flatnonzero(self.is_anomaly)
+
+    def reason(self, index: int) -> str:
+        """Причина аномалии для одного пакета батча"""
+        if not self.is_anomaly[index]:
+            return ""
+        if self._reasons is not None:
+            return self._reasons[index]
+        return self._analyzer._get_anomaly_reason(self.features[index], self.scores[index])
+
+    @property
+    def reasons(self) -> List[str]:
+        """Причины аномалий для всего батча (вычисляются лениво)"""
+        if self._reasons is None:
+            self._reasons = [self.reason(i) for i in range(len(self))]
+        return self._reasons
+
 class PacketAnalyzer:
-    def __init__(self):
-        self.connection_history = defaultdict(list)
-        self.anomaly_detector = IsolationForest(contamination=0.1)
-        self.scaler = StandardScaler()
-        self.training_data = []
-        
+    """Обнаружение аномалий в пакетах или потоках моделью IsolationForest.
+
+    Порог аномалии задается долей ``contamination``: при обучении модель
+    выбирает смещение ``offset_`` так, что эта доля обучающих записей
+    получает отрицательную оценку decision_function. ``anomaly_threshold``
+    сдвигает порог относительно этого смещения. Признаки не зависят от
+    времени работы сервера (частота соединений - в секунду по меткам
+    времени записей), поэтому на стационарном трафике доля аномалий
+    остается близкой к ``contamination``.
+    """
+
+    def __init__(self, retrain_interval: int = 1000, anomaly_threshold: float = 0.0,
+                 contamination: float = 0.01,
+                 background_training: bool = True, window_size: int = 50000,
+                 window_mode: str = 'reservoir', stratify_by: Optional[str] = None,
+                 connection_window: float = 300.0, max_tracked_pairs: int = 1_000_000,
+                 feature_set: str = 'packet', snapshot_dir: Optional[str] = None,
+                 snapshot_interval: float = 300.0):
+        if feature_set not in FEATURE_SETS:
+            raise ValueError(f"Неизвестный набор признаков: {feature_set}")
+        self.feature_set = feature_set
+        self.feature_names = FEATURE_SETS[feature_set]
+        self.n_features = len(self.feature_names)
+        self._columns = {name: i for i, name in enumerate(self.feature_names)}
+        self.connection_tracker = ConnectionRateTracker(
+            window=connection_window, max_keys=max_tracked_pairs
+        )
+        # Пара (scaler, модель) заменяется целиком одним присваиванием,
+        # поэтому скоринг всегда видит согласованную пару
+        self.contamination = contamination
+        self._model: Tuple[StandardScaler, IsolationForest] = (
+            StandardScaler(), IsolationForest(contamination=contamination)
+        )
+        self.training_window = self._create_training_window(window_size, window_mode, stratify_by)
+        self.retrain_interval = retrain_interval
+        self.anomaly_threshold = anomaly_threshold
+        self.background_training = background_training
+        self.packets_seen = 0
+        self.is_fitted = False
+
+        # Состояние и метрики фонового обучения
+        self._training_thread: Optional[threading.Thread] = None
+        self.model_trained_at: Optional[float] = None
+        self.last_training_duration = 0.0
+        self.last_training_size = 0
+        self.training_runs = 0
+        self.training_failures = 0
+
+        # Снимки модели на диске: теплый старт и сохранение после обучения
+        self.logger = logging.getLogger('NetGuardian')
+        self.snapshot_dir = os.path.join(snapshot_dir, feature_set) if snapshot_dir else None
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_lock = threading.Lock()
+        self._unsaved_model: Optional[Tuple] = None  # (модель, обучающие данные) после последнего снимка
+        self._last_snapshot_at: Optional[float] = None
+        if self.snapshot_dir is not None:
+            self.load_model_snapshot()
+
+    def _create_training_window(self, window_size: int, window_mode: str,
+                                stratify_by: Optional[str]):
+        """Создание ограниченного обучающего окна"""
+        if stratify_by is None:
+            return TrainingWindow(window_size, self.n_features, window_mode)
+        if stratify_by not in STRATIFY_FEATURES:
+            raise ValueError(f"Неизвестный признак стратификации: {stratify_by}")
+        feature, n_strata = STRATIFY_FEATURES[stratify_by]
+        return StratifiedTrainingWindow(
+            window_size, self.n_features, self._columns[feature], window_mode,
+            max_strata=n_strata
+        )
+
+    @property
+    def scaler(self) -> StandardScaler:
+        return self._model[0]
+
+    @property
+    def anomaly_detector(self) -> IsolationForest:
+        return self._model[1]
+
+    @property
+    def is_training(self) -> bool:
+        """Идет ли сейчас фоновое обучение"""
+        return self._training_thread is not None and self._training_thread.is_alive()
+
+    def model_age(self) -> float:
+        """Возраст текущей модели в секундах (0, если модель не обучена)"""
+        if self.model_trained_at is None:
+            return 0.0
+        return time.time() - self.model_trained_at
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> bool:
+        """Ожидание завершения фонового обучения"""
+        thread = self._training_thread
+        if thread is not None:
+            thread.join(timeout)
+        return not self.is_training
+
     def analyze_packet(self, packet_data: Dict) -> Tuple[bool, float, str]:
         """Анализ пакета на предмет аномалий"""
-        features = self._extract_features(packet_data)
-        self.training_data.append(features)
-        
-        # Переобучаем модель каждые 1000 пакетов
-        if len(self.training_data) % 1000 == 0:
+        result = self.analyze_batch([packet_data])
+        return bool(result.is_anomaly[0]), float(result.scores[0]), result.reason(0)
+
+    def analyze_batch(self, packets: Sequence[Dict]) -> BatchResult:
+        """Пакетный анализ: один вызов scaler/IsolationForest на весь батч"""
+        features = self._extract_features_batch(packets)
+        self.training_window.add(features)
+
+        # Переобучаем модель каждые retrain_interval пакетов
+        previous = self.packets_seen
+        self.packets_seen += len(packets)
+        if self.packets_seen // self.retrain_interval > previous // self.retrain_interval:
             self._retrain_model()
-            
-        # Определяем аномалию
-        scaled_features = self.scaler.transform([features])
-        anomaly_score = self.anomaly_detector.score_samples([features])[0]
-        is_anomaly = anomaly_score < -0.5
-        
-        reason = self._get_anomaly_reason(packet_data, anomaly_score) if is_anomaly else ""
-        
-        return is_anomaly, anomaly_score, reason
-        
-    def _extract_features(self, packet_data: Dict) -> List[float]:
+
+        scores = self._score(features)
+        is_anomaly = scores < self.anomaly_threshold
+        return BatchResult(self, features, is_anomaly, scores)
+
+    def _score(self, features: np.ndarray) -> np.ndarray:
+        """Оценка матрицы признаков обученной моделью (отрицательные - аномалии)"""
+        if not self.is_fitted or len(features) == 0:
+            return np.zeros(len(features))
+        scaler, detector = self._model
+        try:
+            scaled_features = scaler.transform(features)
+            return detector.decision_function(scaled_features)
+        except NotFittedError:
+            return np.zeros(len(features))
+
+    def _extract_features(self, packet_data: Dict, now: Optional[float] = None) -> List[float]:
         """Извлечение признаков из пакета"""
+        try:
+            timestamp = datetime.fromisoformat(packet_data['timestamp'])
+        except (KeyError, TypeError, ValueError):
+            timestamp = None
         features = [
             packet_data.get('size', 0),
-            len(packet_data.get('packet_summary', '')),
             self._get_protocol_score(packet_data.get('protocol', 'unknown')),
-            self._get_time_score(packet_data.get('timestamp', '')),
-            self._get_connection_frequency(packet_data)
+            self._get_hour_score(timestamp),
+            self._get_connection_rate(packet_data, timestamp.timestamp() if timestamp else now)
         ]
         return features
-        
+
+    def _extract_features_batch(self, packets: Sequence[Dict]) -> np.ndarray:
+        """Извлечение признаков батча в заранее выделенный массив"""
+        features = np.empty((len(packets), self.n_features), dtype=np.float64)
+        extract = self._extract_flow_features if self.feature_set == 'flow' else self._extract_features
+        # Время приема - только для записей без собственной метки времени
+        now = time.time()
+        for i, packet_data in enumerate(packets):
+            features[i] = extract(packet_data, now)
+        return features
+
+    def _extract_flow_features(self, flow: Dict, now: Optional[float] = None) -> List[float]:
+        """Извлечение признаков из записи о потоке"""
+        packets = max(flow.get('packets', 1), 1)
+        flags = flow.get('tcp_flags', 0)
+        features = [
+            flow.get('bytes', 0),
+            packets,
+            flow.get('last_seen', 0) - flow.get('first_seen', 0),
+            flow.get('bytes', 0) / packets,
+            self._get_protocol_score(flow.get('protocol', 'unknown')),
+            self._get_flow_time_score(flow.get('first_seen')),
+            self._get_connection_rate(flow, flow.get('last_seen') or now),
+            # SYN без ACK: попытка соединения без ответа (типично для сканирования)
+            1.0 if flags & TCP_SYN and not flags & TCP_ACK else 0.0
+        ]
+        return features
+
     def _get_protocol_score(self, protocol: str) -> float:
         """Оценка риска протокола"""
-        risk_scores = {
-            'tcp': 1.0,
-            'udp': 2.0,
-            'icmp': 3.0,
-            'unknown': 5.0
-        }
-        return risk_scores.get(protocol.lower(), 5.0)
-        
-    def _get_time_score(self, timestamp: str) -> float:
+        return PROTOCOL_RISK_SCORES.get(protocol.lower(), 5.0)
+
+    def _get_hour_score(self, timestamp: Optional[datetime]) -> float:
         """Оценка временного паттерна"""
+        if timestamp is None:
+            return 5.0
+        # Подозрительное время (ночные часы) получает более высокий скор
+        if 1 <= timestamp.hour <= 5:
+            return 3.0
+        return 1.0
+
+    def _get_flow_time_score(self, first_seen: Optional[float]) -> float:
+        """Оценка временного паттерна по началу потока (UNIX-время)"""
         try:
-            dt = datetime.fromisoformat(timestamp)
-            hour = dt.hour
-            # Подозрительное время (ночные часы) получает более высокий ��кор
-            if 1 <= hour <= 5:
-                return 3.0
-            return 1.0
-        except:
+            return self._get_hour_score(datetime.fromtimestamp(first_seen))
+        except (TypeError, ValueError, OverflowError, OSError):
             return 5.0
-            
-    def _get_connection_frequency(self, packet_data: Dict) -> float:
-        """Оценка частоты соединений"""
-        key = f"{packet_data.get('src_ip', '')}-{packet_data.get('dst_ip', '')}"
-        now = datetime.now()
-        
-        # Очистка старых записей
-        self.connection_history[key] = [
-            ts for ts in self.connection_history[key]
-            if now - ts < timedelta(minutes=5)
-        ]
-        
-        # Добавление нового соединения
-        self.connection_history[key].append(now)
-        
-        # Возвращаем частоту соединений за последние 5 минут
-        return len(self.connection_history[key])
-        
+
+    def _get_connection_rate(self, packet_data: Dict, now: float) -> float:
+        """Частота соединений пары src-dst в секунду по меткам времени записей"""
+        key = (packet_data.get('src_ip', ''), packet_data.get('dst_ip', ''))
+        return self.connection_tracker.rate(key, now)
+
     def _retrain_model(self):
-        """Переобучение модели обнаружения аномалий"""
-        if len(self.training_data) > 100:
-            data_array = np.array(self.training_data)
-            self.scaler.fit(data_array)
-            scaled_data = self.scaler.transform(data_array)
-            self.anomaly_detector.fit(scaled_data)
-            
-    def _get_anomaly_reason(self, packet_data: Dict, score: float) -> str:
-        """Определение причины аномалии"""
+        """Переобучение модели обнаружения аномалий.
+
+        Обучение идет на снимке данных в отдельном потоке; до его
+        завершения пакеты оцениваются предыдущей моделью.
+        """
+        if len(self.training_window) <= 100 or self.is_training:
+            return
+
+        snapshot = self.training_window.snapshot()
+        if not self.background_training:
+            self._fit_snapshot(snapshot)
+            return
+
+        self._training_thread = threading.Thread(
+            target=self._fit_snapshot, args=(snapshot,),
+            name='PacketAnalyzer-retrain', daemon=True
+        )
+        self._training_thread.start()
+
+    def _fit_snapshot(self, data_array: np.ndarray):
+        """Обучение новой пары scaler+модель и атомарная подмена текущей.
+
+        Ошибка обучения не выходит за пределы метода: она записывается в
+        журнал, текущая модель остается, а следующая попытка будет после
+        очередных retrain_interval записей.
+        """
+        started = time.perf_counter()
+        try:
+            scaler = StandardScaler().fit(data_array)
+            detector = IsolationForest(contamination=self.contamination).fit(scaler.transform(data_array))
+        except Exception as e:
+            self.training_failures += 1
+            self.logger.error(f"Error retraining {self.feature_set} model: {str(e)}")
+            return
+
+        self._model = (scaler, detector)
+        self.is_fitted = True
+        self.model_trained_at = time.time()
+        self.last_training_duration = time.perf_counter() - started
+        self.last_training_size = len(data_array)
+        self.training_runs += 1
+
+        if self.snapshot_dir is not None:
+            with self._snapshot_lock:
+                self._unsaved_model = (self._model, data_array)
+            if (self._last_snapshot_at is None
+                    or time.monotonic() - self._last_snapshot_at >= self.snapshot_interval):
+                self.save_model_snapshot()
+
+    def save_model_snapshot(self) -> bool:
+        """Запись последней обученной модели и ее обучающих данных на диск"""
+        with self._snapshot_lock:
+            unsaved, self._unsaved_model = self._unsaved_model, None
+            if self.snapshot_dir is None or unsaved is None:
+                return False
+            model, data_array = unsaved
+            try:
+                model_snapshot.save_snapshot(self.snapshot_dir, model, data_array, {
+                    'feature_set': self.feature_set,
+                    'feature_names': list(self.feature_names),
+                    'trained_at': self.model_trained_at,
+                    'window_seen': self.training_window.seen
+                })
+            except OSError as e:
+                self.logger.error(f"Error saving model snapshot to {self.snapshot_dir}: {str(e)}")
+                return False
+            self._last_snapshot_at = time.monotonic()
+            return True
+
+    def load_model_snapshot(self) -> bool:
+        """Теплый старт: модель и обучающее окно из последнего снимка.
+
+        Несовместимый или поврежденный снимок пропускается, и анализатор
+        начинает с необученной модели.
+        """
+        try:
+            snapshot = model_snapshot.load_snapshot(self.snapshot_dir)
+            if snapshot is None:
+                return False
+            meta, model, training_data = snapshot
+            scaler, detector = model
+            if (meta.get('feature_set') != self.feature_set
+                    or tuple(meta.get('feature_names', ())) != self.feature_names
+                    or training_data.ndim != 2 or training_data.shape[1] != self.n_features
+                    or scaler.n_features_in_ != self.n_features):
+                raise model_snapshot.SnapshotError(
+                    f"набор признаков {meta.get('feature_set')} не совпадает с {self.feature_set}"
+                )
+        except Exception as e:
+            self.logger.warning(f"Ignoring model snapshot in {self.snapshot_dir}: {str(e)}")
+            return False
+
+        self.training_window.restore(training_data, meta.get('window_seen', len(training_data)))
+        self._model = (scaler, detector)
+        self.is_fitted = True
+        self.model_trained_at = meta.get('trained_at')
+        self.last_training_size = len(training_data)
+        self.logger.info(
+            f"Loaded {self.feature_set} model snapshot from {self.snapshot_dir} "
+            f"({len(training_data)} training rows)"
+        )
+        return True
+
+    def _get_anomaly_reason(self, features: np.ndarray, score: float) -> str:
+        """Определение причины аномалии по уже вычисленным признакам"""
         reasons = []
-        
-        if score < -0.8:
+
+        if score < self.anomaly_threshold - EXTREME_ANOMALY_MARGIN:
             reasons.append("Крайне подозрительный паттерн трафика")
-            
-        if self._get_protocol_score(packet_data.get('protocol', 'unknown')) > 3:
+
+        columns = self._columns
+        if features[columns['protocol_score']] > 3:
             reasons.append("Подозрительный протокол")
-            
-        if self._get_time_score(packet_data.get('timestamp', '')) > 2:
+
+        if features[columns['time_score']] > 2:
             reasons.append("Подозрительное время активности")
-            
-        if self._get_connection_frequency(packet_data) > 100:
+
+        if features[columns['connection_rate']] * self.connection_tracker.window > HIGH_CONNECTION_COUNT:
             reasons.append("Высокая частота соединений")
-            
-        return " | ".join(reasons) if reasons else "Неизвестная аномалия" 
\ No newline at end of file
+
+        if 'syn_only' in columns and features[columns['syn_only']]:
+            reasons.append("Соединение без ответа (SYN без ACK)")
+
+        return " | ".join(reasons) if reasons else "Неизвестная аномалия"
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+StageHandler = Callable[[List[Any]], Awaitable[Optional[Iterable[Any]]]]
+
+class PipelineStage:
+    """Стадия конвейера обработки: ограниченная входная очередь и пул обработчиков.
+
+    Обработчик получает пачку элементов (до ``batch_size``, не дольше
+    ``max_batch_latency`` ожидания) и возвращает элементы для следующей
+    стадии. Очереди ограничены, поэтому медленная стадия замедляет
+    предыдущие, а в конечном счете - чтение из сокетов агентов, вместо
+    неограниченного роста памяти.
+
+    Время обработки пачки пишется в гистограмму ``latency_histogram``,
+    заполненность очереди - в ``depth_gauge`` (обе с меткой ``stage``).
+    """
+
+    def __init__(self, name: str, handler: StageHandler, queue_size: int = 8192,
+                 workers: int = 1, batch_size: int = 1, max_batch_latency: float = 0.0,
+                 latency_histogram=None, depth_gauge=None):
+        self.name = name
+        self.handler = handler
+        self.queue_size = queue_size
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_batch_latency = max_batch_latency
+        self.latency_histogram = latency_histogram
+        self.depth_gauge = depth_gauge
+        self.next: Optional['PipelineStage'] = None
+        self.queue: asyncio.Queue = None
+        self.logger = logging.getLogger('NetGuardian')
+        self._tasks: List[asyncio.Task] = []
+        self._closed = False
+
+    def start(self):
+        """Запуск обработчиков стадии (внутри работающего цикла событий)"""
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._closed = False
+        if self.depth_gauge is not None:
+            self.depth_gauge.labels(stage=self.name).set_function(self.queue.qsize)
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Остановка стадии.
+
+        Стадия перестает принимать элементы, дорабатывает очередь (не
+        дольше ``timeout`` секунд) и только затем отменяет обработчики.
+        Стадии конвейера останавливаются по порядку, чтобы выход каждой
+        успел попасть в следующую.
+        """
+        self._closed = True
+        if self.queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                self.logger.error(
+                    f"Pipeline stage {self.name} stopped with {self.queue.qsize()} unprocessed items"
+                )
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def put(self, item: Any):
+        """Передача элемента в стадию; ожидает, если очередь заполнена"""
+        if self._closed:
+            raise RuntimeError(f"Стадия {self.name} остановлена")
+        await self.queue.put(item)
+
+    async def _collect(self) -> List[Any]:
+        """Сбор пачки: до batch_size элементов или до истечения max_batch_latency"""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_batch_latency
+
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+            try:
+                outputs = await self.handler(batch)
+            except Exception as e:
+                self.logger.error(f"Error in pipeline stage {self.name}: {str(e)}")
+                outputs = None
+            if self.latency_histogram is not None:
+                self.latency_histogram.labels(stage=self.name).observe(time.perf_counter() - started)
+
+            if outputs and self.next is not None:
+                for item in outputs:
+                    await self.next.put(item)
+            # Элементы считаются обработанными, когда их выход уже в следующей стадии
+            for _ in batch:
+                self.queue.task_done()
+
+def connect_stages(*stages: PipelineStage) -> List[PipelineStage]:
+    """Последовательное соединение стадий в конвейер"""
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.next = next_stage
+    return list(stages)
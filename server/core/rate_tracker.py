@@ -0,0 +1,115 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+# Нижняя граница интервала для оценки частоты: соединения с одинаковой
+# меткой времени не дают бесконечной частоты
+MIN_ELAPSED = 0.001
+
+class ConnectionRateTracker:
+    """Счетчик соединений в скользящем окне с фиксированной памятью.
+
+    Окно разбито на ``n_buckets`` корзин; для каждой пары хранится только
+    массив счетчиков корзин и их сумма, поэтому обновление стоит O(1)
+    независимо от интенсивности потока. Пары упорядочены по времени
+    последней активности: простаивающие дольше окна и самые старые при
+    превышении ``max_keys`` вытесняются с начала очереди.
+
+    ``rate()`` переводит счетчик в частоту в секунду: число соединений
+    делится на время от первого из них, но не больше окна. При
+    постоянной интенсивности оценка не растет со временем наблюдения,
+    поэтому признак, обученный в начале работы, сопоставим с признаком
+    спустя часы.
+    """
+
+    def __init__(self, window: float = 300.0, n_buckets: int = 30, max_keys: int = 1_000_000):
+        self.window = window
+        self.n_buckets = n_buckets
+        self.bucket_width = window / n_buckets
+        self.max_keys = max_keys
+        # ключ -> [номер последней корзины, сумма по окну, счетчики корзин,
+        #         момент первого соединения в окне, момент самого позднего]
+        self._pairs: 'OrderedDict[Hashable, list]' = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def hit(self, key: Hashable, now: Optional[float] = None) -> int:
+        """Регистрация соединения и возврат числа соединений пары за окно"""
+        if now is None:
+            now = time.monotonic()
+        return self._hit(key, now)[1]
+
+    def rate(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Регистрация соединения и оценка частоты соединений пары в секунду (0 для первого)"""
+        if now is None:
+            now = time.monotonic()
+        state = self._hit(key, now)
+        # Время берется до самого позднего соединения: записи могут прийти не по порядку
+        elapsed = state[4] - state[3]
+        if elapsed >= self.window:
+            return state[1] / self.window
+        return (state[1] - 1) / max(elapsed, MIN_ELAPSED)
+
+    def _hit(self, key: Hashable, now: float) -> list:
+        bucket = int(now // self.bucket_width)
+
+        state = self._pairs.get(key)
+        if state is None:
+            state = [bucket, 0, [0] * self.n_buckets, now, now]
+            self._pairs[key] = state
+        else:
+            self._advance(state, bucket)
+            self._pairs.move_to_end(key)
+            if state[1] == 0:
+                state[3] = state[4] = now
+            else:
+                state[3] = min(state[3], now)
+                state[4] = max(state[4], now)
+
+        state[2][bucket % self.n_buckets] += 1
+        state[1] += 1
+
+        self._evict(bucket)
+        return state
+
+    def count(self, key: Hashable, now: Optional[float] = None) -> int:
+        """Число соединений пары за окно без регистрации нового"""
+        state = self._pairs.get(key)
+        if state is None:
+            return 0
+        if now is None:
+            now = time.monotonic()
+        self._advance(state, int(now // self.bucket_width))
+        return state[1]
+
+    def _advance(self, state: list, bucket: int):
+        """Обнуление корзин, вышедших из окна с момента последнего обновления"""
+        last = state[0]
+        if bucket <= last:
+            return
+        counts = state[2]
+        if bucket - last >= self.n_buckets:
+            counts[:] = [0] * self.n_buckets
+            state[1] = 0
+        else:
+            for expired in range(last + 1, bucket + 1):
+                index = expired % self.n_buckets
+                state[1] -= counts[index]
+                counts[index] = 0
+        state[0] = bucket
+
+    def _evict(self, bucket: int):
+        """Вытеснение простаивающих пар и пар сверх лимита"""
+        pairs = self._pairs
+        while len(pairs) > self.max_keys:
+            pairs.popitem(last=False)
+            self.evicted += 1
+
+        while pairs:
+            oldest = next(iter(pairs.values()))
+            if bucket - oldest[0] < self.n_buckets:
+                break
+            pairs.popitem(last=False)
+            self.evicted += 1
@@ -0,0 +1,147 @@
+import asyncio
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from cryptography.fernet import Fernet
+
+from agents.common.protocol import open_frame
+from server.core.packet_analyzer import PacketAnalyzer
+
+SHARD_KEYS = ('agent', 'flow')
+
+# Состояние процесса-воркера: по анализатору на набор признаков и ключ расшифровки кадров
+_worker_analyzers: Dict[str, PacketAnalyzer] = {}
+_worker_fernet: Optional[Fernet] = None
+
+def _init_worker(analyzer_kwargs: Dict[str, Any], encryption_key: Optional[bytes] = None):
+    """Инициализация анализаторов в процессе-воркере"""
+    global _worker_fernet
+    if encryption_key:
+        _worker_fernet = Fernet(encryption_key)
+    for feature_set in ('packet', 'flow'):
+        _worker_analyzers[feature_set] = PacketAnalyzer(feature_set=feature_set, **analyzer_kwargs)
+
+def _save_worker_snapshots():
+    """Запись несохраненных моделей воркера перед остановкой"""
+    for analyzer in _worker_analyzers.values():
+        analyzer.save_model_snapshot()
+
+def _decode_in_worker(flags: int, token: bytes) -> List[Dict]:
+    """Расшифровка, распаковка и десериализация кадра агента в воркере"""
+    return open_frame(_worker_fernet, flags, token)
+
+def _analyze_in_worker(records: List[Dict]) -> List[Tuple[int, float, str]]:
+    """Анализ батча в воркере; возвращаются только аномалии (индекс, оценка, причина)"""
+    anomalies = []
+    for feature_set in ('packet', 'flow'):
+        indices = [
+            i for i, record in enumerate(records)
+            if (record.get('type') == 'flow') == (feature_set == 'flow')
+        ]
+        if not indices:
+            continue
+        result = _worker_analyzers[feature_set].analyze_batch([records[i] for i in indices])
+        for position in result.anomaly_indices:
+            anomalies.append((indices[position], float(result.scores[position]), result.reason(position)))
+    return anomalies
+
+class ShardedAnalyzerPool:
+    """Пул процессов-анализаторов, шардированный по агенту или по потоку.
+
+    Каждый шард - отдельный однопроцессный ProcessPoolExecutor, поэтому
+    записи с одним ключом всегда попадают в один процесс и состояние
+    анализатора (частота соединений, обучающее окно) остается
+    согласованным. Число батчей в очереди шарда ограничено ``queue_depth``.
+
+    С ключом ``encryption_key`` воркеры также расшифровывают кадры агентов
+    (``decode``): процессу сервера передается уже готовый список записей.
+    """
+
+    def __init__(self, workers: int, analyzer_kwargs: Dict[str, Any],
+                 shard_by: str = 'agent', queue_depth: int = 8, depth_gauge=None,
+                 encryption_key: Optional[bytes] = None):
+        if shard_by not in SHARD_KEYS:
+            raise ValueError(f"Неизвестный ключ шардирования: {shard_by}")
+        self.workers = workers
+        self.analyzer_kwargs = analyzer_kwargs
+        self.encryption_key = encryption_key
+        self.shard_by = shard_by
+        self.queue_depth = queue_depth
+        self.depth_gauge = depth_gauge
+        self.depths = [0] * workers
+        self._executors: List[ProcessPoolExecutor] = []
+        self._slots: List[asyncio.Semaphore] = []
+
+    def start(self):
+        """Запуск процессов-воркеров"""
+        context = multiprocessing.get_context('spawn')
+        for shard in range(self.workers):
+            self._executors.append(ProcessPoolExecutor(
+                max_workers=1, mp_context=context,
+                initializer=_init_worker, initargs=(self._shard_kwargs(shard), self.encryption_key)
+            ))
+            self._slots.append(asyncio.Semaphore(self.queue_depth))
+
+    def _shard_kwargs(self, shard: int) -> Dict[str, Any]:
+        """Параметры анализаторов шарда: у каждого шарда свой каталог снимков модели"""
+        kwargs = dict(self.analyzer_kwargs)
+        if kwargs.get('snapshot_dir'):
+            kwargs['snapshot_dir'] = os.path.join(kwargs['snapshot_dir'], f'shard-{shard}')
+        return kwargs
+
+    def shutdown(self):
+        """Остановка процессов-воркеров (уже поставленная работа и запись моделей завершаются)"""
+        for executor in self._executors:
+            if self.analyzer_kwargs.get('snapshot_dir'):
+                executor.submit(_save_worker_snapshots)
+            executor.shutdown(wait=False)
+        self._executors = []
+
+    def _shard(self, record: Dict) -> int:
+        if self.shard_by == 'flow':
+            key = f"{record.get('src_ip', '')}-{record.get('dst_ip', '')}"
+        else:
+            key = str(record.get('agent_id', ''))
+        return self._key_shard(key)
+
+    def _key_shard(self, key: str) -> int:
+        # crc32 стабилен между процессами и перезапусками, в отличие от hash()
+        return zlib.crc32(key.encode()) % self.workers
+
+    async def decode(self, agent_id: str, flags: int, token: bytes) -> List[Dict]:
+        """Расшифровка кадра в шарде агента; возвращает записи кадра"""
+        return await self._submit(self._key_shard(agent_id), _decode_in_worker, flags, token)
+
+    async def analyze(self, records: List[Dict]) -> List[Tuple[Dict, float, str]]:
+        """Анализ батча; возвращает аномалии в виде (запись, оценка, причина)"""
+        shards: Dict[int, List[Dict]] = {}
+        for record in records:
+            shards.setdefault(self._shard(record), []).append(record)
+
+        results = await asyncio.gather(*(
+            self._submit(shard, _analyze_in_worker, shard_records) for shard, shard_records in shards.items()
+        ))
+
+        anomalies = []
+        for shard_records, shard_anomalies in zip(shards.values(), results):
+            for index, score, reason in shard_anomalies:
+                anomalies.append((shard_records[index], score, reason))
+        return anomalies
+
+    async def _submit(self, shard: int, func: Callable, *args) -> Any:
+        # Глубина учитывает и батчи, ожидающие свободного слота шарда
+        self._set_depth(shard, 1)
+        try:
+            async with self._slots[shard]:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executors[shard], func, *args
+                )
+        finally:
+            self._set_depth(shard, -1)
+
+    def _set_depth(self, shard: int, delta: int):
+        self.depths[shard] += delta
+        if self.depth_gauge is not None:
+            self.depth_gauge.labels(shard=str(shard)).set(self.depths[shard])
@@ -0,0 +1,88 @@
+import queue
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import Dict, Optional
+
+class SMTPConnectionPool:
+    """Пул постоянных SMTP-соединений.
+
+    Подключение, STARTTLS и авторизация выполняются один раз на
+    соединение, а не на каждое письмо. Отправка идет в собственных
+    потоках пула и не блокирует цикл событий. Соединение, простоявшее
+    дольше ``idle_timeout``, перед использованием проверяется командой
+    NOOP; разорванное соединение переоткрывается, и письмо отправляется
+    повторно один раз.
+    """
+
+    def __init__(self, email_config: Dict, size: int = 2, idle_timeout: float = 60.0,
+                 timeout: float = 30.0):
+        self.email_config = email_config
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='smtp')
+        # Свободные соединения: (соединение или None, время последнего использования)
+        self._idle: 'queue.Queue' = queue.Queue()
+        for _ in range(size):
+            self._idle.put((None, 0.0))
+
+    def _connect(self) -> smtplib.SMTP:
+        config = self.email_config
+        server = smtplib.SMTP(config['smtp_server'], config['smtp_port'], timeout=self.timeout)
+        server.starttls()
+        server.login(config['username'], config['password'])
+        return server
+
+    def _is_alive(self, server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, msg: Message):
+        """Отправка письма (блокирующая, вызывается в потоке пула)"""
+        server, last_used = self._idle.get()
+        try:
+            if server is not None and time.monotonic() - last_used > self.idle_timeout:
+                if not self._is_alive(server):
+                    self._close(server)
+                    server = None
+            if server is None:
+                server = self._connect()
+            try:
+                server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._close(server)
+                server = None
+                server = self._connect()
+                server.send_message(msg)
+        except Exception:
+            self._close(server)
+            server = None
+            raise
+        finally:
+            self._idle.put((server, time.monotonic()))
+
+    def submit(self, msg: Message):
+        """Отправка письма в потоке пула, возвращает concurrent.futures.Future"""
+        return self.executor.submit(self.send, msg)
+
+    @staticmethod
+    def _close(server: Optional[smtplib.SMTP]):
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        self.executor.shutdown(wait=True)
+        while not self._idle.empty():
+            server, _ = self._idle.get_nowait()
+            self._close(server)
@@ -0,0 +1,29 @@
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Ограничитель частоты «ведро токенов».
+
+    Ведро пополняется со скоростью ``rate`` токенов в секунду и вмещает
+    не больше ``burst`` токенов: короткий всплеск до ``burst`` событий
+    проходит сразу, дальше - не чаще ``rate`` в секунду.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.rejected = 0
+
+    def consume(self, tokens: float = 1.0, now: Optional[float] = None) -> bool:
+        """Списание токенов; False, если их недостаточно"""
+        if now is None:
+            now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < tokens:
+            self.rejected += 1
+            return False
+        self.tokens -= tokens
+        return True
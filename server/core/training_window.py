@@ -0,0 +1,138 @@
+import numpy as np
+from typing import Dict, Optional
+
+WINDOW_MODES = ('reservoir', 'ring')
+
+class TrainingWindow:
+    """Обучающая выборка фиксированного размера на основе массива NumPy.
+
+    В режиме ``reservoir`` хранит равномерную случайную выборку из всех
+    поступивших строк (алгоритм R), в режиме ``ring`` - последние
+    ``capacity`` строк. Память и стоимость переобучения не зависят от
+    времени работы сервера.
+    """
+
+    def __init__(self, capacity: int, n_features: int, mode: str = 'reservoir',
+                 seed: Optional[int] = None):
+        if capacity <= 0:
+            raise ValueError("Размер обучающего окна должен быть положительным")
+        if mode not in WINDOW_MODES:
+            raise ValueError(f"Неизвестный режим обучающего окна: {mode}")
+        self.capacity = capacity
+        self.mode = mode
+        self.data = np.empty((capacity, n_features), dtype=np.float64)
+        self.size = 0
+        self.seen = 0
+        self._position = 0
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, rows: np.ndarray):
+        """Добавление батча строк признаков"""
+        if len(rows) == 0:
+            return
+        if self.mode == 'ring':
+            self._add_ring(rows)
+        else:
+            self._add_reservoir(rows)
+        self.seen += len(rows)
+
+    def _add_ring(self, rows: np.ndarray):
+        rows = rows[-self.capacity:]
+        positions = (self._position + np.arange(len(rows))) % self.capacity
+        self.data[positions] = rows
+        self._position = (self._position + len(rows)) % self.capacity
+        self.size = min(self.size + len(rows), self.capacity)
+
+    def _add_reservoir(self, rows: np.ndarray):
+        # Пока окно не заполнено, строки просто дописываются
+        free = self.capacity - self.size
+        if free > 0:
+            head = rows[:free]
+            self.data[self.size:self.size + len(head)] = head
+            self.size += len(head)
+            rows = rows[free:]
+            if len(rows) == 0:
+                return
+
+        # Строка с порядковым номером t замещает случайный слот с вероятностью capacity / (t + 1)
+        first = self.seen + free if free > 0 else self.seen
+        totals = np.arange(first + 1, first + len(rows) + 1)
+        slots = (self._rng.random(len(rows)) * totals).astype(np.int64)
+        accepted = slots < self.capacity
+        self.data[slots[accepted]] = rows[accepted]
+
+    def snapshot(self) -> np.ndarray:
+        """Копия текущего содержимого окна для обучения"""
+        return self.data[:self.size].copy()
+
+    def restore(self, rows: np.ndarray, seen: int):
+        """Заполнение пустого окна сохраненными строками (теплый старт).
+
+        Строки, отображенные в память, используются как хранилище окна без
+        копирования, если заполняют его целиком.
+        """
+        rows = rows[:self.capacity]
+        if len(rows) == self.capacity and rows.flags.writeable:
+            self.data = rows
+        else:
+            self.data[:len(rows)] = rows
+        self.size = len(rows)
+        self.seen = max(seen, self.size)
+        self._position = self.size % self.capacity
+
+class StratifiedTrainingWindow:
+    """Набор обучающих окон, по одному на страту (протокол, время суток).
+
+    Редкие страты не вытесняются доминирующим трафиком: каждая получает
+    свою долю общей емкости.
+    """
+
+    def __init__(self, capacity: int, n_features: int, column: int, mode: str = 'reservoir',
+                 max_strata: int = 8, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.n_features = n_features
+        self.column = column
+        self.mode = mode
+        self.max_strata = max_strata
+        self.stratum_capacity = max(1, capacity // max_strata)
+        self.windows: Dict[float, TrainingWindow] = {}
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return sum(len(window) for window in self.windows.values())
+
+    def add(self, rows: np.ndarray):
+        """Добавление батча строк с разбиением по значению столбца страты"""
+        if len(rows) == 0:
+            return
+        keys = rows[:, self.column]
+        for key in np.unique(keys):
+            window = self._get_window(float(key))
+            if window is not None:
+                window.add(rows[keys == key])
+        self.seen += len(rows)
+
+    def _get_window(self, key: float) -> Optional[TrainingWindow]:
+        window = self.windows.get(key)
+        if window is None and len(self.windows) < self.max_strata:
+            window = TrainingWindow(
+                self.stratum_capacity, self.n_features, self.mode,
+                seed=int(self._rng.integers(2 ** 32))
+            )
+            self.windows[key] = window
+        return window
+
+    def restore(self, rows: np.ndarray, seen: int):
+        """Заполнение пустого окна сохраненными строками (теплый старт)"""
+        self.add(rows)
+        self.seen = max(seen, len(rows))
+
+    def snapshot(self) -> np.ndarray:
+        """Объединенная копия всех страт"""
+        if not self.windows:
+            return np.empty((0, self.n_features), dtype=np.float64)
+        return np.concatenate([window.snapshot() for window in self.windows.values()])
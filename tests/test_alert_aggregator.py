@@ -0,0 +1,54 @@
+from server.core.alert_aggregator import AlertAggregator
+
+def make_alert(timestamp: str, severity: int = 1, src_ip: str = '10.0.0.1'):
+    return {
+        'type': 'anomaly',
+        'description': 'unusual traffic',
+        'source': {'src_ip': src_ip},
+        'severity': severity,
+        'timestamp': timestamp
+    }
+
+def test_repeats_fold_into_incident():
+    """Повторы в окне увеличивают счетчик первого оповещения"""
+    aggregator = AlertAggregator(window=60.0)
+    first, is_new = aggregator.add(make_alert('t1'), now=0.0)
+    repeat, repeat_is_new = aggregator.add(make_alert('t2', severity=3), now=30.0)
+
+    assert is_new and not repeat_is_new
+    assert repeat is first
+    assert first['count'] == 2
+    assert first['last_seen'] == 't2'
+    assert first['severity'] == 3
+    assert aggregator.folded == 1
+
+def test_key_reuse_closes_expired_incident():
+    """Повтор ключа после окна открывает новый инцидент, а старый возвращает expire()"""
+    aggregator = AlertAggregator(window=60.0)
+    first, _ = aggregator.add(make_alert('t1'), now=0.0)
+    aggregator.add(make_alert('t2'), now=10.0)
+
+    second, is_new = aggregator.add(make_alert('t3'), now=70.0)
+    assert is_new and second is not first
+    assert len(aggregator) == 1
+    assert aggregator.expire(now=70.0) == [first]
+    assert aggregator.expire(now=70.0) == []
+
+def test_flush_returns_incidents_closed_on_key_reuse():
+    """flush() возвращает и инциденты, закрытые в add()"""
+    aggregator = AlertAggregator(window=60.0)
+    first, _ = aggregator.add(make_alert('t1'), now=0.0)
+    aggregator.add(make_alert('t2'), now=10.0)
+    second, _ = aggregator.add(make_alert('t3'), now=70.0)
+    aggregator.add(make_alert('t4'), now=80.0)
+
+    assert aggregator.flush() == [first, second]
+    assert len(aggregator) == 0
+
+def test_single_alerts_are_not_reported_on_close():
+    """Инцидент без повторов не возвращается при закрытии"""
+    aggregator = AlertAggregator(window=60.0, max_incidents=1)
+    aggregator.add(make_alert('t1', src_ip='10.0.0.1'), now=0.0)
+    aggregator.add(make_alert('t2', src_ip='10.0.0.2'), now=1.0)
+    assert aggregator.expire(now=1.0) == []
+    assert len(aggregator) == 1
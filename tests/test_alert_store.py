@@ -0,0 +1,58 @@
+import time
+
+from server.core.alert_store import AlertStore
+
+def make_alert(number: int, severity: int = 1, alert_type: str = 'anomaly'):
+    return {'id': f'alert-{number}', 'type': alert_type, 'severity': severity}
+
+def test_query_returns_newest_first_with_filters():
+    """Выборка идет от новых к старым с фильтрами по критичности и типу"""
+    store = AlertStore(capacity=100)
+    now = time.time()
+    for number in range(10):
+        store.add(make_alert(number, severity=number % 3,
+                             alert_type='scan' if number % 2 else 'anomaly'), now=now)
+
+    assert [alert['id'] for alert in store.query(limit=3)] == ['alert-9', 'alert-8', 'alert-7']
+    assert [alert['id'] for alert in store.query(min_severity=2)] == ['alert-8', 'alert-5', 'alert-2']
+    assert [alert['id'] for alert in store.query(alert_type='scan', limit=2, offset=1)] == [
+        'alert-7', 'alert-5'
+    ]
+    assert store.count(min_severity=1) == 6
+    assert store.count(alert_type='scan', min_severity=2) == 1
+
+def test_capacity_evicts_oldest():
+    """Сверх capacity вытесняются самые старые оповещения и их записи в индексах"""
+    store = AlertStore(capacity=5)
+    now = time.time()
+    for number in range(12):
+        store.add(make_alert(number, severity=2 if number < 3 else 1), now=now)
+
+    assert len(store) == 5
+    assert store.query(limit=10)[-1]['id'] == 'alert-7'
+    assert store.count(min_severity=2) == 0
+    assert store.query(min_severity=2) == []
+
+def test_retention_and_time_range():
+    """Оповещения старше retention удаляются, выборка ограничивается по времени"""
+    store = AlertStore(capacity=100, retention=60.0)
+    now = time.time()
+    store.add(make_alert(0), now=now - 120)
+    store.add(make_alert(1), now=now - 30)
+    store.add(make_alert(2), now=now - 10)
+
+    assert len(store) == 2
+    assert [alert['id'] for alert in store.query(since=now - 20)] == ['alert-2']
+    assert [alert['id'] for alert in store.query(until=now - 20)] == ['alert-1']
+
+def test_update_reindexes_severity():
+    """Рост критичности свернутого оповещения виден в фильтрах"""
+    store = AlertStore(capacity=10)
+    alert = make_alert(0, severity=1)
+    store.add(alert)
+    alert['severity'] = 3
+    store.update(alert)
+
+    assert store.query(min_severity=3) == [alert]
+    assert store.count(min_severity=3) == 1
+    assert store.count(min_severity=1) == 1
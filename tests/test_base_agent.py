@@ -0,0 +1,83 @@
+import asyncio
+
+from cryptography.fernet import Fernet
+
+from agents.common.base_agent import BaseAgent
+from agents.common.protocol import encode_frame, read_frame
+
+async def run_agent_against_server(tmp_path, key: bytes):
+    """Агент отправляет кадры серверу, который перестает, а затем снова начинает подтверждать их"""
+    fernet = Fernet(key)
+    received = []
+    acking = {'enabled': True}
+
+    async def handle(reader, writer):
+        frames = 0
+        while True:
+            records = await read_frame(reader, fernet)
+            if records is None:
+                break
+            frames += 1
+            if records[0].get('type') == 'data':
+                received.append(records[0]['number'])
+            if acking['enabled']:
+                writer.write(encode_frame(fernet, [{'type': 'ack', 'frames': frames}]))
+                await writer.drain()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    agent = BaseAgent(f'tcp://127.0.0.1:{port}', key, {'agents': {
+        'reconnect_delay': 0.1,
+        'spool': {'directory': str(tmp_path / 'spool'), 'ack_timeout': 0.3, 'replay_rate': 100}
+    }})
+    agent.is_running = True
+    agent._write_lock = asyncio.Lock()
+    agent._acked = asyncio.Event()
+    replay = asyncio.create_task(agent._replay_loop())
+
+    async def send(number: int):
+        await agent._connect()
+        frame = encode_frame(fernet, [{'type': 'data', 'number': number}])
+        if agent._writer is None or len(agent.spool):
+            agent._spool_frame(frame)
+            return
+        try:
+            await agent._write_frame(frame, 'live')
+        except Exception:
+            agent._disconnect()
+
+    for number in range(3):
+        await send(number)
+    await asyncio.sleep(0.1)
+    unacked_after_ack = len(agent._unacked)
+
+    acking['enabled'] = False
+    for number in range(3, 6):
+        await send(number)
+    await asyncio.sleep(0.6)
+    spooled_after_timeout = len(agent.spool)
+
+    acking['enabled'] = True
+    for number in range(6, 8):
+        await send(number)
+    await asyncio.sleep(1.0)
+
+    agent.is_running = False
+    replay.cancel()
+    agent._disconnect()
+    server.close()
+    await server.wait_closed()
+    return received, unacked_after_ack, spooled_after_timeout, len(agent.spool)
+
+def test_unacked_frames_are_resent_in_order(tmp_path, monkeypatch):
+    """Кадры без подтверждения сервера возвращаются в дисковую очередь и досылаются по порядку"""
+    monkeypatch.chdir(tmp_path)
+    received, unacked_after_ack, spooled_after_timeout, spool_left = asyncio.run(
+        run_agent_against_server(tmp_path, Fernet.generate_key())
+    )
+
+    assert unacked_after_ack == 0
+    assert spooled_after_timeout == 3
+    assert spool_left == 0
+    # Доставка «хотя бы один раз»: потерянные подтверждения ведут к повтору, но не к пропуску
+    assert received == [0, 1, 2, 3, 4, 5, 3, 4, 5, 6, 7]
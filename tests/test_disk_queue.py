@@ -0,0 +1,82 @@
+from agents.common.disk_queue import CURSOR, ENTRY_HEADER, DiskQueue
+
+def test_round_trip_across_segments(tmp_path):
+    """Записи возвращаются в порядке поступления, в том числе через границу сегментов"""
+    queue = DiskQueue(str(tmp_path), segment_size=256)
+    items = [b'record-%03d' % i for i in range(50)]
+    for item in items:
+        queue.append(item)
+
+    assert len(queue) == 50
+    assert len(queue._segments) > 1
+    assert [queue.pop() for _ in range(50)] == items
+    assert queue.pop() is None
+    assert len(queue) == 0
+
+def test_reopen_resumes_after_acknowledged(tmp_path):
+    """После закрытия очередь продолжает с первой неподтвержденной записи"""
+    queue = DiskQueue(str(tmp_path), segment_size=256)
+    for i in range(30):
+        queue.append(b'record-%03d' % i)
+    for _ in range(12):
+        queue.pop()
+    queue.close()
+
+    queue = DiskQueue(str(tmp_path), segment_size=256)
+    assert len(queue) == 18
+    assert queue.pop() == b'record-012'
+
+def test_cursor_survives_crash_after_segment_reuse(tmp_path):
+    """Сбой после опустошения очереди и новых записей не сбивает позицию чтения"""
+    queue = DiskQueue(str(tmp_path), segment_size=4096, fsync='interval', fsync_interval=3600)
+    for i in range(5):
+        queue.append(b'old-%d' % i)
+    queue.pop()
+    queue.flush()  # курсор на диске указывает на вторую старую запись
+    for _ in range(4):
+        queue.pop()
+    # Сегмент переиспользован с начала, новые записи длиннее прежних
+    for i in range(3):
+        queue.append(b'new-record-%d' % i)
+    del queue  # без close() и flush(): как при аварийном завершении
+
+    queue = DiskQueue(str(tmp_path), segment_size=4096)
+    assert len(queue) == 3
+    assert [queue.pop() for _ in range(3)] == [b'new-record-%d' % i for i in range(3)]
+
+def test_stale_cursor_inside_entry(tmp_path):
+    """Позиция курсора внутри записи сдвигается к ее началу"""
+    queue = DiskQueue(str(tmp_path))
+    for i in range(3):
+        queue.append(b'record-%d' % i)
+    queue.close()
+    with open(tmp_path / 'cursor', 'wb') as f:
+        f.write(CURSOR.pack(0, ENTRY_HEADER.size + 3))
+
+    queue = DiskQueue(str(tmp_path))
+    assert len(queue) == 3
+    assert queue.peek() == b'record-0'
+
+def test_corrupt_record_is_skipped(tmp_path):
+    """Поврежденная запись пропускается вместе с остатком сегмента, а не останавливает очередь"""
+    queue = DiskQueue(str(tmp_path), segment_size=128)
+    for i in range(12):
+        queue.append(b'record-%02d' % i)
+    first = queue._segments[0]
+    in_first = DiskQueue._count_entries(first, 0, first.write_offset)
+    first.map[ENTRY_HEADER.size] ^= 0xFF
+
+    assert queue.peek() == b'record-%02d' % in_first
+    assert len(queue) == 12 - in_first
+    assert queue.dropped == in_first
+
+def test_max_bytes_drops_oldest_segment(tmp_path):
+    """При превышении max_bytes удаляется самый старый сегмент"""
+    queue = DiskQueue(str(tmp_path), segment_size=128, max_bytes=256)
+    for i in range(20):
+        queue.append(b'record-%02d' % i)
+
+    assert queue.size_bytes <= 256
+    assert queue.dropped > 0
+    assert len(queue) + queue.dropped == 20
+    assert queue.pop() == b'record-%02d' % queue.dropped
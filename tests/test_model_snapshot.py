@@ -0,0 +1,71 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from server.core import model_snapshot
+from server.core.packet_analyzer import PacketAnalyzer
+
+def fit_model(data: np.ndarray):
+    scaler = StandardScaler().fit(data)
+    return scaler, IsolationForest(n_estimators=10, random_state=0).fit(scaler.transform(data))
+
+def current_meta_path(directory) -> str:
+    with open(os.path.join(directory, model_snapshot.CURRENT)) as f:
+        return os.path.join(directory, f.read().strip(), 'meta.json')
+
+def rewrite_meta(directory, **fields):
+    path = current_meta_path(directory)
+    with open(path) as f:
+        meta = json.load(f)
+    meta.update(fields)
+    with open(path, 'w') as f:
+        json.dump(meta, f)
+
+def test_round_trip(tmp_path):
+    """Снимок возвращает модель, метаданные и обучающие данные"""
+    data = np.random.default_rng(0).normal(size=(200, 4))
+    model_snapshot.save_snapshot(str(tmp_path), fit_model(data), data, {'feature_set': 'packet'})
+
+    meta, (scaler, detector), training_data = model_snapshot.load_snapshot(str(tmp_path))
+    assert meta['feature_set'] == 'packet'
+    assert meta['version'] == model_snapshot.SNAPSHOT_VERSION
+    assert np.array_equal(training_data, data)
+    assert len(detector.predict(scaler.transform(data))) == 200
+
+def test_missing_snapshot(tmp_path):
+    """Без снимков load_snapshot возвращает None"""
+    assert model_snapshot.load_snapshot(str(tmp_path)) is None
+
+@pytest.mark.parametrize('fields', [
+    {'version': model_snapshot.SNAPSHOT_VERSION - 1},
+    {'sklearn_version': '0.0.0'}
+])
+def test_incompatible_snapshot_is_rejected(tmp_path, fields):
+    """Снимок другой версии формата или scikit-learn отклоняется"""
+    data = np.random.default_rng(0).normal(size=(200, 4))
+    model_snapshot.save_snapshot(str(tmp_path), fit_model(data), data, {'feature_set': 'packet'})
+    rewrite_meta(tmp_path, **fields)
+
+    with pytest.raises(model_snapshot.SnapshotError):
+        model_snapshot.load_snapshot(str(tmp_path))
+
+def test_analyzer_ignores_old_snapshot(tmp_path):
+    """Анализатор со снимком старой версии начинает с необученной модели"""
+    analyzer = PacketAnalyzer(background_training=False, snapshot_dir=str(tmp_path))
+    data = np.random.default_rng(0).normal(size=(200, analyzer.n_features))
+    analyzer._fit_snapshot(data)
+    # Первая обученная модель сохраняется сразу
+    assert analyzer._last_snapshot_at is not None
+
+    warm = PacketAnalyzer(background_training=False, snapshot_dir=str(tmp_path))
+    assert warm.is_fitted
+    assert len(warm.training_window) == 200
+
+    rewrite_meta(tmp_path / 'packet', version=model_snapshot.SNAPSHOT_VERSION - 1)
+    cold = PacketAnalyzer(background_training=False, snapshot_dir=str(tmp_path))
+    assert not cold.is_fitted
+    assert len(cold.training_window) == 0
@@ -0,0 +1,66 @@
+import pytest
+
+from benchmarks.traffic import TrafficGenerator
+from server.core import packet_analyzer
+from server.core.packet_analyzer import PacketAnalyzer
+
+WARMUP = 5000
+RECORDS = 10000
+BATCH = 512
+
+@pytest.mark.parametrize('feature_set', ['packet', 'flow'])
+@pytest.mark.parametrize('contamination', [0.01, 0.05])
+def test_flag_rate_follows_contamination(feature_set, contamination):
+    """Доля аномалий на трафике генератора бенчмарков не превышает 2 x contamination и не растет"""
+    generator = TrafficGenerator(seed=0)
+    produce = generator.packets if feature_set == 'packet' else generator.flow_records
+    analyzer = PacketAnalyzer(
+        feature_set=feature_set, contamination=contamination,
+        retrain_interval=WARMUP, background_training=False
+    )
+    analyzer.analyze_batch(produce(WARMUP))
+    assert analyzer.is_fitted
+    analyzer.retrain_interval = 10 ** 9
+
+    records = produce(RECORDS)
+    flags = []
+    for i in range(0, len(records), BATCH):
+        flags.extend(analyzer.analyze_batch(records[i:i + BATCH]).is_anomaly)
+
+    half = len(flags) // 2
+    assert sum(flags) / len(flags) <= 2 * contamination
+    # Признаки не дрейфуют со временем работы: во второй половине аномалий не больше допустимого
+    assert sum(flags[half:]) / (len(flags) - half) <= 2 * contamination
+
+def test_connection_rate_is_stationary():
+    """Частота соединений пары при постоянной интенсивности не растет со временем наблюдения"""
+    analyzer = PacketAnalyzer(background_training=False)
+    packet = {'src_ip': '10.0.0.1', 'dst_ip': '10.0.0.2', 'protocol': 'tcp', 'size': 100}
+    rates = [
+        analyzer._get_connection_rate(packet, 1000.0 + i * 0.1)  # 10 соединений в секунду
+        for i in range(5000)
+    ]
+    assert rates[0] == 0
+    for rate in (rates[100], rates[2999], rates[4999]):
+        assert rate == pytest.approx(10.0, rel=0.05)
+
+@pytest.mark.parametrize('background', [True, False])
+def test_failed_retraining_does_not_stop_analysis(monkeypatch, background):
+    """Ошибка обучения записывается в журнал, и следующее переобучение проходит"""
+    class BrokenForest:
+        def __init__(self, **kwargs):
+            raise MemoryError("no memory for the forest")
+
+    analyzer = PacketAnalyzer(retrain_interval=500, background_training=background)
+    records = TrafficGenerator(seed=0).packets(1000)
+    with monkeypatch.context() as patched:
+        patched.setattr(packet_analyzer, 'IsolationForest', BrokenForest)
+        analyzer.analyze_batch(records[:500])
+        assert analyzer.wait_for_training(30)
+    assert analyzer.training_failures == 1
+    assert not analyzer.is_fitted
+
+    analyzer.analyze_batch(records[500:])
+    assert analyzer.wait_for_training(30)
+    assert analyzer.is_fitted
+    assert analyzer.training_runs == 1
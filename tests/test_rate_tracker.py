@@ -0,0 +1,34 @@
+import pytest
+
+from server.core.rate_tracker import ConnectionRateTracker
+
+def test_count_covers_sliding_window():
+    """Счетчик учитывает соединения только за последние window секунд"""
+    tracker = ConnectionRateTracker(window=10.0, n_buckets=10)
+    for i in range(20):
+        tracker.hit('pair', now=100.0 + i)  # одно соединение в секунду
+
+    assert tracker.count('pair', now=119.5) == 10
+    assert tracker.count('pair', now=125.5) == 4
+    assert tracker.count('pair', now=200.0) == 0
+
+def test_rate_does_not_depend_on_observation_time():
+    """Оценка частоты при постоянной интенсивности одинакова в начале и спустя много окон"""
+    tracker = ConnectionRateTracker(window=60.0, n_buckets=30)
+    rates = [tracker.rate('pair', now=i * 0.5) for i in range(2000)]  # 2 соединения в секунду
+
+    assert rates[0] == 0
+    assert rates[100] == pytest.approx(2.0, rel=0.05)
+    assert rates[-1] == pytest.approx(2.0, rel=0.05)
+
+def test_idle_and_excess_pairs_are_evicted():
+    """Пары без активности дольше окна и сверх max_keys вытесняются"""
+    tracker = ConnectionRateTracker(window=10.0, n_buckets=10, max_keys=3)
+    for i in range(5):
+        tracker.hit(i, now=0.0)
+    assert len(tracker) == 3
+    assert tracker.count(0, now=0.0) == 0
+
+    tracker.hit('late', now=50.0)
+    assert len(tracker) == 1
+    assert tracker.evicted == 5
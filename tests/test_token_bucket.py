@@ -0,0 +1,29 @@
+from server.core.token_bucket import TokenBucket
+
+def test_burst_then_rejects():
+    """Всплеск до burst проходит сразу, следующее событие отклоняется"""
+    bucket = TokenBucket(rate=1.0, burst=3)
+    now = bucket.updated
+    assert all(bucket.consume(now=now) for _ in range(3))
+    assert not bucket.consume(now=now)
+    assert bucket.rejected == 1
+
+def test_tokens_refill_at_rate():
+    """Токены восстанавливаются со скоростью rate"""
+    bucket = TokenBucket(rate=2.0, burst=4)
+    now = bucket.updated
+    for _ in range(4):
+        bucket.consume(now=now)
+
+    assert not bucket.consume(now=now + 0.25)
+    assert bucket.consume(now=now + 0.5)
+    assert bucket.consume(now=now + 1.0)
+    assert not bucket.consume(now=now + 1.0)
+
+def test_refill_is_capped_by_burst():
+    """После долгого простоя доступно не больше burst токенов"""
+    bucket = TokenBucket(rate=10.0, burst=2)
+    now = bucket.updated + 3600
+    assert bucket.consume(now=now)
+    assert bucket.consume(now=now)
+    assert not bucket.consume(now=now)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from server.core.training_window import StratifiedTrainingWindow, TrainingWindow
+
+def feed(window, total: int, batch: int):
+    """Подача строк 0..total-1 батчами по batch (одна колонка - порядковый номер)"""
+    for start in range(0, total, batch):
+        rows = np.arange(start, min(start + batch, total), dtype=np.float64).reshape(-1, 1)
+        window.add(rows)
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_reservoir_is_uniform_over_stream(seed):
+    """Каждая десятая часть потока представлена в резервуаре примерно поровну"""
+    capacity, total = 1000, 20000
+    window = TrainingWindow(capacity, 1, seed=seed)
+    feed(window, total, batch=512)
+
+    assert len(window) == capacity
+    assert window.seen == total
+    values = window.snapshot()[:, 0]
+    assert len(np.unique(values)) == capacity
+    deciles = np.bincount((values * 10 // total).astype(int), minlength=10)
+    # Ожидается по 100 строк на дециль, стандартное отклонение ~9.5
+    assert deciles.min() >= 60 and deciles.max() <= 140
+
+def test_reservoir_inclusion_probability():
+    """Вероятность попасть в резервуар одинакова для ранних и поздних строк"""
+    capacity, total, trials = 50, 500, 400
+    hits = np.zeros(total)
+    for seed in range(trials):
+        window = TrainingWindow(capacity, 1, seed=seed)
+        feed(window, total, batch=37)
+        hits[window.snapshot()[:, 0].astype(int)] += 1
+
+    expected = trials * capacity / total
+    assert hits[:100].mean() == pytest.approx(expected, rel=0.15)
+    assert hits[-100:].mean() == pytest.approx(expected, rel=0.15)
+
+def test_ring_keeps_latest_rows():
+    """Режим ring хранит последние capacity строк"""
+    window = TrainingWindow(100, 1, mode='ring')
+    feed(window, 1050, batch=64)
+    assert len(window) == 100
+    assert sorted(window.snapshot()[:, 0]) == list(range(950, 1050))
+
+def test_stratified_window_keeps_rare_stratum():
+    """Редкая страта не вытесняется доминирующей"""
+    window = StratifiedTrainingWindow(800, 2, column=1, max_strata=4, seed=0)
+    rows = np.zeros((10000, 2))
+    rows[:, 0] = np.arange(10000)
+    rows[::100, 1] = 1.0  # каждая сотая строка - редкая страта
+    window.add(rows)
+
+    sample = window.snapshot()
+    assert len(window.windows[0.0]) == 200
+    assert (sample[:, 1] == 1.0).sum() == 100
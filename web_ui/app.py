@@ -1,16 +1,26 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 from flask_socketio import SocketIO
 from flask_login import LoginManager, UserMixin, login_required
 import yaml
 import redis
 from elasticsearch import Elasticsearch
 import jwt
+import requests
 from datetime import datetime, timedelta
+import base64
+import binascii
 import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
 socketio = SocketIO(app)
+logger = logging.getLogger('NetGuardian-WebUI')
 login_manager = LoginManager()
 login_manager.init_app(app)
 
@@ -42,35 +52,193 @@ def index():
     """Главная страница"""
     return render_template('index.html')
 
+# Реестр агентов, который ведет сервер (server/core/agent_registry.py)
+AGENTS_KEY_PREFIX = config.get('agents', {}).get('registry', {}).get('key_prefix', 'agent')
+
 @app.route('/api/agents')
 @login_required
 def get_agents():
-    """Получение списка агентов"""
-    agents = redis_client.hgetall('agents')
-    return jsonify([
-        {
+    """Получение списка агентов.
+
+    Тело ответа - список агентов, как и раньше. С параметром since
+    возвращаются только агенты, изменившиеся после этой версии; версию
+    для следующего запроса содержит заголовок X-Agents-Cursor.
+    """
+    since = request.args.get('since')
+    if since and not since.isdigit():
+        return jsonify({'error': 'since must be a version returned in X-Agents-Cursor'}), 400
+    agents, cursor = read_agents(int(since) if since else None)
+    response = jsonify(agents)
+    response.headers['X-Agents-Cursor'] = str(cursor)
+    return response
+
+def read_agents(since=None):
+    """Агенты из реестра в Redis, изменившиеся после версии since (все при None), и новая версия"""
+    changed_key = f"{AGENTS_KEY_PREFIX}:changed"
+    if since:
+        entries = redis_client.zrangebyscore(changed_key, f'({since}', '+inf', withscores=True)
+    else:
+        entries = redis_client.zrange(changed_key, 0, -1, withscores=True)
+
+    pipe = redis_client.pipeline(transaction=False)
+    for agent_id, _ in entries:
+        pipe.hgetall(f"{AGENTS_KEY_PREFIX}:{agent_id.decode()}")
+    agents = []
+    for (agent_id, _), fields in zip(entries, pipe.execute() if entries else []):
+        if not fields:
+            # Агент удален по TTL, запись об изменении еще не подчищена
+            continue
+        agents.append({
             'id': agent_id.decode(),
-            'data': json.loads(agent_data.decode())
-        }
-        for agent_id, agent_data in agents.items()
-    ])
+            'data': {name.decode(): json.loads(value) for name, value in fields.items()}
+        })
+
+    cursor = int(entries[-1][1]) if entries else int(since or 0)
+    return agents, cursor
+
+TIMEFRAMES = {
+    '1h': timedelta(hours=1),
+    '24h': timedelta(days=1),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30)
+}
+
+# Разрешения агрегатов метрик, которые ведет сервер (server/core/metric_rollups.py),
+# от грубого к точному; начало периода выравнивается по самому грубому, дающему
+# не меньше MIN_ROLLUP_BUCKETS корзин
+ROLLUP_RESOLUTIONS = (('1d', 86400), ('1h', 3600), ('1m', 60))
+MIN_ROLLUP_BUCKETS = 24
+
+MAX_ALERTS_PER_PAGE = 200
+# Поля оповещения, которые отображает таблица оповещений
+ALERT_FIELDS = ['id', 'timestamp', 'type', 'severity', 'description', 'count', 'last_seen']
+rollups_config = config.get('rollups', {})
+
+cache_config = config['web_ui'].get('cache', {})
+cache_requests = Counter(
+    'web_cache_requests', 'Dashboard API response cache lookups', ['endpoint', 'result']
+)
+
+def cache_key(endpoint, params):
+    """Ключ кэша по нормализованным параметрам запроса"""
+    normalized = '&'.join(
+        f"{name}={params[name]}" for name in sorted(params) if params[name] is not None
+    )
+    return f"cache:{endpoint}:{normalized}"
+
+def cached_response(endpoint, params, ttl, compute):
+    """Ответ из кэша Redis или результат compute() с сохранением на ttl секунд.
+
+    Одинаковые одновременные промахи объединяются: запрос к источнику
+    выполняет только получивший блокировку, остальные ждут его результат
+    в кэше. При недоступности Redis ответ вычисляется напрямую.
+    """
+    if not cache_config.get('enabled', True) or ttl <= 0:
+        return compute()
+
+    key = cache_key(endpoint, params)
+    lock_key = f"{key}:lock"
+    lock_timeout = cache_config.get('lock_timeout', 5)
+    try:
+        value = redis_client.get(key)
+        if value is not None:
+            cache_requests.labels(endpoint=endpoint, result='hit').inc()
+            return json.loads(value)
+
+        if redis_client.set(lock_key, 1, nx=True, ex=lock_timeout):
+            cache_requests.labels(endpoint=endpoint, result='miss').inc()
+            try:
+                result = compute()
+                redis_client.set(key, json.dumps(result, default=str), ex=ttl)
+                return result
+            finally:
+                redis_client.delete(lock_key)
+
+        # Такой же запрос уже выполняется другим обработчиком: ждем его результат
+        cache_requests.labels(endpoint=endpoint, result='coalesced').inc()
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = redis_client.get(key)
+            if value is not None:
+                return json.loads(value)
+            if not redis_client.exists(lock_key):
+                break
+    except redis.RedisError:
+        cache_requests.labels(endpoint=endpoint, result='error').inc()
+    return compute()
 
 @app.route('/api/metrics')
 @login_required
 def get_metrics():
     """Получение метрик"""
     timeframe = request.args.get('timeframe', '1h')
+    if timeframe not in TIMEFRAMES:
+        timeframe = '1h'
     
+    ttl = cache_config.get('metrics_ttl', {}).get(timeframe, 30)
+    compute = query_rollups if rollups_config.get('enabled', True) else query_metrics
+    return jsonify(cached_response(
+        'metrics', {'timeframe': timeframe}, ttl, lambda: compute(timeframe)
+    ))
+
+def query_rollups(timeframe):
+    """Метрики за период из агрегатов в Redis; ответ в формате агрегаций Elasticsearch"""
+    span = TIMEFRAMES[timeframe].total_seconds()
+    width = next(
+        width for _, width in ROLLUP_RESOLUTIONS
+        if span / width >= MIN_ROLLUP_BUCKETS or width == ROLLUP_RESOLUTIONS[-1][1]
+    )
+    
+    now = time.time()
+    first = int((now - span) // width * width)
+    prefix = rollups_config.get('key_prefix', 'rollup')
+    pipe = redis_client.pipeline(transaction=False)
+    for resolution, bucket in rollup_buckets(first, int(now)):
+        pipe.hgetall(f"{prefix}:{resolution}:{bucket}")
+    
+    totals = dict.fromkeys(('cpu_sum', 'cpu_count', 'memory_sum', 'memory_count', 'net_sent'), 0.0)
+    for bucket in pipe.execute():
+        for field, value in bucket.items():
+            field = field.decode()
+            if field in totals:
+                totals[field] += float(value)
+    
+    return {
+        'cpu_usage': {
+            'value': totals['cpu_sum'] / totals['cpu_count'] if totals['cpu_count'] else None
+        },
+        'memory_usage': {
+            'value': totals['memory_sum'] / totals['memory_count'] if totals['memory_count'] else None
+        },
+        'network_traffic': {'value': totals['net_sent']}
+    }
+
+def rollup_buckets(start, end):
+    """Корзины (разрешение, начало), покрывающие [start, end] без пересечений.
+
+    С каждой точки берется самая грубая корзина, выровненная по ней:
+    мелкие корзины нужны только до первой границы крупной, поэтому 7d
+    читается из 8 суточных и не более 23 часовых корзин вместо 169
+    часовых. Последняя корзина содержит данные только до текущего
+    момента.
+    """
+    buckets = []
+    point = start
+    while point <= end:
+        resolution, width = next(
+            (name, width) for name, width in ROLLUP_RESOLUTIONS
+            if point % width == 0 or width == ROLLUP_RESOLUTIONS[-1][1]
+        )
+        buckets.append((resolution, point // width * width))
+        point = point // width * width + width
+    return buckets
+
+def query_metrics(timeframe):
+    """Агрегация метрик за период в Elasticsearch"""
     # Формируем временной диапазон
     now = datetime.now()
-    if timeframe == '1h':
-        start_time = now - timedelta(hours=1)
-    elif timeframe == '24h':
-        start_time = now - timedelta(days=1)
-    elif timeframe == '7d':
-        start_time = now - timedelta(days=7)
-    else:
-        start_time = now - timedelta(hours=1)
+    start_time = now - TIMEFRAMES[timeframe]
     
     # Запрос к Elasticsearch
     query = {
@@ -100,53 +268,363 @@ def get_metrics():
         body=query
     )
     
-    return jsonify(result['aggregations'])
+    return result['aggregations']
 
 @app.route('/api/alerts')
 @login_required
 def get_alerts():
-    """Получение списка оповещений"""
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 50))
-    severity = request.args.get('min_severity')
+    """Получение списка оповещений.
+
+    Страницы листаются курсором: ``next_cursor`` из ответа передается
+    параметром ``cursor`` для следующей страницы.
+    """
+    try:
+        per_page = int(request.args.get('per_page', 50))
+        severity = request.args.get('min_severity')
+        severity = int(severity) if severity else None
+    except ValueError:
+        return jsonify({'error': 'per_page and min_severity must be integers'}), 400
+    per_page = max(1, min(per_page, MAX_ALERTS_PER_PAGE))
+    try:
+        search_after = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+    
+    params = {'cursor': request.args.get('cursor'), 'per_page': per_page, 'min_severity': severity}
+    return jsonify(cached_response(
+        'alerts', params, cache_config.get('alerts_ttl', 5),
+        lambda: query_alerts(search_after, per_page, severity)
+    ))
+
+def encode_cursor(sort_values):
+    """Курсор страницы: значения сортировки (timestamp, id) последнего оповещения"""
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode()).decode()
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        sort_values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(str(e))
+    if not isinstance(sort_values, list) or len(sort_values) != 2:
+        raise ValueError('cursor must hold (timestamp, id)')
+    return sort_values
+
+def query_alerts(search_after, per_page, severity):
+    """Страница оповещений из памяти сервера или из Elasticsearch"""
+    # Первая страница берется из памяти сервера без запроса к Elasticsearch
+    server_api = config['web_ui'].get('server_api')
+    if search_after is None and server_api:
+        params = {'limit': per_page}
+        if severity is not None:
+            params['min_severity'] = severity
+        try:
+            response = requests.get(f"{server_api}/alerts/recent", params=params, timeout=1)
+            response.raise_for_status()
+            result = response.json()
+            alerts = [
+                {field: alert.get(field) for field in ALERT_FIELDS} for alert in result['alerts']
+            ]
+            last = alerts[-1] if len(alerts) == per_page else None
+            return {
+                'total': result['total'],
+                'alerts': alerts,
+                'next_cursor': encode_cursor([last['timestamp'], last['id']]) if last else None
+            }
+        except requests.RequestException:
+            pass
     
     query = {
-        "sort": [{"timestamp": {"order": "desc"}}],
-        "from": (page - 1) * per_page,
+        "sort": [
+            {"timestamp": {"order": "desc"}},
+            # Дополнительный ключ делает порядок полным для search_after
+            {"id.keyword": {"order": "desc", "unmapped_type": "keyword"}}
+        ],
         "size": per_page,
+        "_source": ALERT_FIELDS,
         "query": {
             "bool": {
                 "must": [
-                    {"range": {"severity": {"gte": severity}}} if severity else {"match_all": {}}
+                    {"range": {"severity": {"gte": severity}}} if severity is not None else {"match_all": {}}
                 ]
             }
         }
     }
+    if search_after is not None:
+        query["search_after"] = search_after
     
     result = es_client.search(
         index=f"{config['elasticsearch']['index_prefix']}-alerts-*",
         body=query
     )
     
-    return jsonify({
+    hits = result['hits']['hits']
+    return {
         'total': result['hits']['total']['value'],
-        'alerts': [hit['_source'] for hit in result['hits']['hits']]
-    })
+        'alerts': [hit['_source'] for hit in hits],
+        'next_cursor': encode_cursor(hits[-1]['sort']) if len(hits) == per_page else None
+    }
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Метрики веб-интерфейса для Prometheus"""
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+# Комната, в которую попадает каждый подключенный клиент дашборда
+DASHBOARD_ROOM = 'dashboard'
+MAX_SEVERITY = 10
+
+class UpdateBroadcaster:
+    """Рассылка обновлений дашборда по тикам фиксированной частоты.
+
+    Обновления не отправляются сразу: между тиками они сливаются по паре
+    (событие, комната), и за тик клиент получает одно сообщение только с
+    изменившимися полями. Для каждой пары хранится полный снимок
+    состояния - его получает новый подписчик комнаты.
+
+    Каждое сообщение клиент подтверждает. Пока подтверждения нет, новые
+    дельты клиенту не отправляются, а после подтверждения он получает
+    полные снимки своих комнат. Медленный клиент поэтому видит последнее
+    состояние, а не растущую очередь устаревших сообщений. Если
+    подтверждение не пришло за ``ack_timeout`` секунд, сообщение
+    считается потерянным, и клиенту снова отправляются полные снимки.
+    """
+
+    def __init__(self, socketio, interval: float = 0.25, ack_timeout: float = 10.0):
+        self.socketio = socketio
+        self.interval = interval
+        self.ack_timeout = ack_timeout
+        self._lock = threading.Lock()
+        self._snapshots = defaultdict(dict)  # (событие, комната) -> полное состояние
+        self._changes = defaultdict(dict)  # (событие, комната) -> поля, измененные за тик
+        self._members = defaultdict(set)  # комната -> sid клиентов
+        self._rooms = defaultdict(set)  # sid -> комнаты клиента
+        self._waiting = {}  # sid -> срок подтверждения отправленного сообщения (monotonic)
+        self._stale = set()  # клиенты, которым нужен полный снимок
+        self._started = False
+
+    def start(self):
+        """Запуск фоновой рассылки (однократно)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def publish(self, event: str, data: dict, room: str = DASHBOARD_ROOM):
+        """Учет обновления; будет отправлено на ближайшем тике"""
+        with self._lock:
+            self._snapshots[(event, room)].update(data)
+            self._changes[(event, room)].update(data)
+
+    def join(self, sid: str, room: str):
+        """Подписка клиента на комнату; снимок комнаты придет на ближайшем тике"""
+        with self._lock:
+            self._members[room].add(sid)
+            self._rooms[sid].add(room)
+            self._stale.add(sid)
+
+    def leave(self, sid: str, room: str):
+        """Отписка клиента от комнаты"""
+        with self._lock:
+            self._discard(sid, room)
+            self._rooms[sid].discard(room)
+
+    def remove(self, sid: str):
+        """Удаление отключившегося клиента"""
+        with self._lock:
+            for room in self._rooms.pop(sid, ()):
+                self._discard(sid, room)
+            self._waiting.pop(sid, None)
+            self._stale.discard(sid)
+
+    def _discard(self, sid: str, room: str):
+        members = self._members.get(room)
+        if members is not None:
+            members.discard(sid)
+            if not members:
+                del self._members[room]
+
+    def _ack(self, sid: str, *args):
+        with self._lock:
+            self._waiting.pop(sid, None)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"Realtime broadcast failed: {str(e)}")
+
+    def _collect(self) -> dict:
+        """Сообщения тика: sid -> {событие: данные}"""
+        with self._lock:
+            now = time.monotonic()
+            for sid, deadline in list(self._waiting.items()):
+                if now >= deadline:
+                    # Сообщение или подтверждение потеряно: клиент получит полные снимки
+                    del self._waiting[sid]
+                    self._stale.add(sid)
+
+            changes, self._changes = self._changes, defaultdict(dict)
+            messages = defaultdict(lambda: defaultdict(dict))
+
+            for (event, room), delta in changes.items():
+                for sid in self._members.get(room, ()):
+                    if sid in self._waiting:
+                        self._stale.add(sid)
+                    elif sid not in self._stale:
+                        messages[sid][event].update(delta)
+
+            for sid in list(self._stale):
+                if sid in self._waiting:
+                    continue
+                self._stale.discard(sid)
+                rooms = self._rooms.get(sid, ())
+                for (event, room), snapshot in self._snapshots.items():
+                    if room in rooms:
+                        messages[sid][event].update(snapshot)
+
+            self._waiting.update(dict.fromkeys(messages, now + self.ack_timeout))
+            return messages
+
+    def _tick(self):
+        for sid, events in self._collect().items():
+            for event, data in events.items():
+                self.socketio.emit(event, data, to=sid, callback=partial(self._ack, sid))
+
+class UpdateFeed:
+    """Источник обновлений дашборда для рассылки через WebSocket.
+
+    Раз в ``interval`` секунд читает изменения реестра агентов в Redis
+    после версии прошлого чтения и последние оповещения из памяти
+    сервера (``web_ui.server_api``) и публикует изменившееся через
+    send_realtime_update.
+    """
+
+    def __init__(self, socketio, interval: float = 1.0, latest_alerts: int = 10):
+        self.socketio = socketio
+        self.interval = interval
+        self.latest_alerts = latest_alerts
+        self._agents_cursor = None
+        self._statuses = {}  # агент -> последний известный статус
+        self._seen_alerts = set()  # (id, count) оповещений последнего чтения
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Запуск фонового опроса (однократно)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Realtime update poll failed: {str(e)}")
+            self.socketio.sleep(self.interval)
+
+    def poll(self):
+        """Одно чтение источников и публикация изменений"""
+        self._poll_agents()
+        self._poll_alerts()
+
+    def _poll_agents(self):
+        agents, self._agents_cursor = read_agents(self._agents_cursor)
+        for agent in agents:
+            self._statuses[agent['id']] = agent['data'].get('status')
+            send_realtime_update({'agent': agent}, agent_id=agent['id'])
+        if agents:
+            online = sum(1 for status in self._statuses.values() if status == 'online')
+            send_realtime_update({'active_agents': online})
+
+    def _poll_alerts(self):
+        server_api = config['web_ui'].get('server_api')
+        if not server_api:
+            return
+        response = requests.get(
+            f"{server_api}/alerts/recent", params={'limit': self.latest_alerts}, timeout=1
+        )
+        response.raise_for_status()
+        result = response.json()
+        alerts = [{field: alert.get(field) for field in ALERT_FIELDS} for alert in result['alerts']]
+
+        # Свернутый повтор меняет count у того же id, поэтому он тоже считается изменением
+        seen = {(alert['id'], alert['count']) for alert in alerts}
+        new = [alert for alert in alerts if (alert['id'], alert['count']) not in self._seen_alerts]
+        self._seen_alerts = seen
+        if not new:
+            return
+        send_realtime_update({'latest_alerts': alerts, 'alerts_count': result['total']})
+        for alert in new:
+            send_realtime_update({'alert': alert}, severity=alert['severity'])
+
+realtime_config = config['web_ui'].get('realtime', {})
+broadcaster = UpdateBroadcaster(
+    socketio, realtime_config.get('tick_interval', 0.25), realtime_config.get('ack_timeout', 10)
+)
+feed = UpdateFeed(socketio, realtime_config.get('poll_interval', 1.0))
 
 @socketio.on('connect')
 @login_required
 def handle_connect():
     """Обработка подключения WebSocket"""
-    print('Client connected')
+    broadcaster.start()
+    feed.start()
+    broadcaster.join(request.sid, DASHBOARD_ROOM)
+    logger.info(f"Client connected: {request.sid}")
+
+@socketio.on('subscribe')
+@login_required
+def handle_subscribe(data):
+    """Подписка на обновления агента и/или оповещения от заданной критичности"""
+    data = data or {}
+    if data.get('agent_id'):
+        broadcaster.join(request.sid, f"agent:{data['agent_id']}")
+    if data.get('min_severity') is not None:
+        try:
+            min_severity = int(data['min_severity'])
+        except (TypeError, ValueError):
+            return
+        for severity in range(max(min_severity, 0), MAX_SEVERITY + 1):
+            broadcaster.join(request.sid, f"severity:{severity}")
+
+@socketio.on('unsubscribe')
+@login_required
+def handle_unsubscribe(data):
+    """Отписка от обновлений агента и/или оповещений по критичности"""
+    data = data or {}
+    if data.get('agent_id'):
+        broadcaster.leave(request.sid, f"agent:{data['agent_id']}")
+    if data.get('min_severity') is not None:
+        for severity in range(MAX_SEVERITY + 1):
+            broadcaster.leave(request.sid, f"severity:{severity}")
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Обработка отключения WebSocket"""
-    print('Client disconnected')
+    broadcaster.remove(request.sid)
+    logger.info(f"Client disconnected: {request.sid}")
+
+def send_realtime_update(data, agent_id=None, severity=None):
+    """Публикация обновления через WebSocket.
 
-def send_realtime_update(data):
-    """Отправка обновлений через WebSocket"""
-    socketio.emit('update', data)
+    Общие метрики идут всем клиентам дашборда, данные агента - в его
+    комнату, оповещения - в комнату своей критичности. Отправка
+    происходит на ближайшем тике рассылки.
+    """
+    if agent_id is None and severity is None:
+        broadcaster.publish('update', data)
+    if agent_id is not None:
+        broadcaster.publish('update', data, room=f"agent:{agent_id}")
+    if severity is not None:
+        broadcaster.publish('update', data, room=f"severity:{severity}")
 
 if __name__ == '__main__':
     socketio.run(